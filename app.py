@@ -4,21 +4,65 @@ Provides web interface and API endpoints for 3D geospatial entity resolution
 """
 
 import os
-import json
-import re
+import logging
+import gzip
+import mmap
+import uuid
+import traceback
+import tempfile
+from urllib.parse import unquote
+import orjson
+import msgpack
+import numpy as np
 import pandas as pd
 from flask import Flask, render_template, jsonify, request, make_response
+from flask.json.provider import DefaultJSONProvider
 from flask_compress import Compress
 from pathlib import Path
 import hashlib
+import functools
+import threading
+import itertools
+from concurrent.futures import ThreadPoolExecutor
 import redis
+from cachetools import LRUCache
 
 from tasks import celery as celery_app
 from tasks import calculate_features as calculate_features_task
 from tasks import load_bkafi_results as load_bkafi_task
+from tasks import build_building_file_index as build_building_file_index_task
+from tasks import index_building_files
+from data_cache import (
+    NUMERIC_ID_RE, BKAFI_FLAT_KEY, BKAFI_BY_FILE_KEY, BKAFI_HASH_KEY, BKAFI_PAIRS_KEY, bkafi_key,
+    building_features_key, build_features_from_parquet, count_pairs_per_file, ensure_features_files,
+    load_bkafi_results_file, write_bkafi_hash, write_bkafi_pairs
+)
+
+
+class OrjsonProvider(DefaultJSONProvider):
+    """Serve jsonify() and request.get_json() through orjson (compact output, numpy-aware)"""
+    option = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj, default=self.default, option=self.option).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
 
 app = Flask(__name__)
-# Enable compression for all responses (gzip)
+# Only this app's provider is replaced; other Flask apps in the process keep the default
+app.json = OrjsonProvider(app)
+
+# Per-request diagnostics are logged at DEBUG; production runs at WARNING so they cost a level check
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'WARNING').upper()
+logging.basicConfig(format='%(asctime)s %(levelname)s %(name)s: %(message)s')
+logger = logging.getLogger(__name__)
+logger.setLevel(LOG_LEVEL)
+# Enable compression for responses big enough to benefit (Brotli when the client supports it, else gzip)
+app.config['COMPRESS_MIN_SIZE'] = 2048
+app.config['COMPRESS_LEVEL'] = 5
+app.config['COMPRESS_ALGORITHM'] = ['br', 'gzip']
 Compress(app)
 
 # Configuration
@@ -30,13 +74,18 @@ LOGS_DIR = BASE_DIR / 'logs'
 
 # Results JSON files
 DEMO_RESULTS_JSON = RESULTS_DIR / 'demo_inference' / 'demo_detailed_results_XGBClassifier_seed1.json'
+# Same results as one {"file", "bid", "data"} object per line (scripts/convert_results_to_jsonl.py), preferred when present
+DEMO_RESULTS_JSONL = DEMO_RESULTS_JSON.with_suffix('.jsonl')
 DEMO_METRICS_JSON = RESULTS_DIR / 'demo_inference' / 'demo_metrics_summary_seed1.json'
 FEATURES_PARQUET = DATA_DIR / 'property_dicts' / 'features.parquet'
+# Source of the parquet; converted at image build time, or at startup when a deployment ships only this file
+FEATURES_JOBLIB = DATA_DIR / 'property_dicts' / 'Hague_demo_130425_demo_inference_vector_normalization=True_seed=1.joblib'
 
 # Confidence threshold for predictions (hardcoded, but easy to make configurable)
 CONFIDENCE_THRESHOLD = 0.5
 REDIS_URL = os.getenv('REDIS_URL', 'redis://redis:6379/0')
 CACHE_TTL_SECONDS = int(os.getenv('CACHE_TTL_SECONDS', '21600'))
+REDIS_MAX_CONNECTIONS = int(os.getenv('REDIS_MAX_CONNECTIONS', '32'))
 
 _redis_client = None
 
@@ -46,7 +95,15 @@ def get_redis_client():
     if _redis_client is not None:
         return _redis_client
     try:
-        client = redis.Redis.from_url(REDIS_URL, decode_responses=True)
+        # One explicitly sized pool shared by all request threads of this worker.
+        # Keep values as bytes: payloads are orjson/gzip bytes and orjson parses bytes directly
+        pool = redis.ConnectionPool.from_url(
+            REDIS_URL,
+            max_connections=REDIS_MAX_CONNECTIONS,
+            decode_responses=False,
+            socket_keepalive=True,
+        )
+        client = redis.Redis(connection_pool=pool)
         client.ping()
         _redis_client = client
         return _redis_client
@@ -54,6 +111,42 @@ def get_redis_client():
         return None
 
 
+def _dumps(payload):
+    """Serialize to JSON bytes with orjson (handles numpy scalars/arrays natively)"""
+    return orjson.dumps(payload, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS)
+
+
+_loads = orjson.loads
+
+
+def load_json_file(path):
+    """Parse a JSON file straight from a read-only memory map, skipping the read() copy"""
+    with open(path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return _loads(b'')
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm, memoryview(mm) as view:
+            return _loads(view)
+
+
+def _packb(payload):
+    """Serialize to MessagePack (smaller and faster to decode than JSON for the large BKAFI blobs)"""
+    return msgpack.packb(payload, use_bin_type=True)
+
+
+def _unpackb(raw):
+    return msgpack.unpackb(raw, raw=False, strict_map_key=False)
+
+
+# MessagePack-encoded; the mp: prefix keeps it apart from the old JSON value
+BUILDING_FILE_INDEX_KEY = 'mp:building_file_index'
+# Set while the BKAFI load queued at startup runs; handlers answer 503 instead of parsing the results themselves.
+# Queuing sets it with a short TTL that the Celery task extends once it starts, so without a worker to pick
+# the load up the handlers fall back to loading the results file themselves after a few seconds
+BKAFI_WARMING_KEY = 'bkafi:warming'
+BKAFI_QUEUED_TTL_SECONDS = int(os.getenv('BKAFI_QUEUED_TTL_SECONDS', '15'))
+BKAFI_RETRY_AFTER_SECONDS = 5
+
+
 def cache_get_json(key):
     client = get_redis_client()
     if not client:
@@ -61,26 +154,185 @@ def cache_get_json(key):
     raw = client.get(key)
     if not raw:
         return None
-    return json.loads(raw)
+    return _loads(raw)
+
+
+def cache_get_raw_many(keys):
+    """Get several raw payloads in one Redis round-trip; missing keys come back as None"""
+    client = get_redis_client()
+    if not client:
+        return [None] * len(keys)
+    with client.pipeline(transaction=False) as pipe:
+        for key in keys:
+            pipe.get(key)
+        return [raw or None for raw in pipe.execute()]
+
+
+def cache_get_json_many(keys):
+    """Get several JSON payloads in one Redis round-trip; missing keys come back as None"""
+    return [_loads(raw) if raw else None for raw in cache_get_raw_many(keys)]
+
+
+def cache_get_mp(key):
+    client = get_redis_client()
+    if not client:
+        return None
+    raw = client.get(key)
+    if not raw:
+        return None
+    return _unpackb(raw)
+
+
+def cache_set_mp(key, payload, ttl=CACHE_TTL_SECONDS):
+    client = get_redis_client()
+    if not client:
+        return False
+    client.set(key, _packb(payload), ex=ttl)
+    return True
+
+
+def cache_set_bkafi_hash(flattened_cache, source_mtime, ttl=CACHE_TTL_SECONDS):
+    """Store each BKAFI candidate as its own Redis hash field so handlers can HGET one building"""
+    client = get_redis_client()
+    if not client:
+        return False
+    write_bkafi_hash(client, flattened_cache, source_mtime, ttl)
+    return True
+
+
+def cache_set_bkafi_pairs(pairs_per_file, source_mtime, ttl=CACHE_TTL_SECONDS):
+    """Store the per-file pair counts as a Redis hash so the summary needs a single HGET"""
+    client = get_redis_client()
+    if not client:
+        return False
+    write_bkafi_pairs(client, pairs_per_file, source_mtime, ttl)
+    return True
 
 
 def cache_set_json(key, payload, ttl=CACHE_TTL_SECONDS):
     client = get_redis_client()
     if not client:
         return False
-    client.set(key, json.dumps(payload), ex=ttl)
+    client.set(key, _dumps(payload), ex=ttl)
     return True
 
 
-def build_features_from_parquet(parquet_path: Path):
-    df = pd.read_parquet(parquet_path)
-    building_features = {}
-    for row in df.itertuples(index=False):
-        building_id = str(row.building_id)
-        feature_name = str(row.feature_name)
-        value = row.value
-        building_features.setdefault(building_id, {})[feature_name] = value
-    return building_features
+def cache_set_features(file_path, building_features, ttl=CACHE_TTL_SECONDS):
+    """
+    Store a file's features in Redis as the whole-file blob plus one small key per building (shared by
+    all files), in one pipeline; keys another writer already populated are left alone (NX)
+    """
+    client = get_redis_client()
+    if not client:
+        return False
+    blob_key = f'features:{file_path}'
+    # Skip serializing the whole blob when it is already there
+    write_blob = not client.exists(blob_key)
+    with client.pipeline(transaction=False) as pipe:
+        if write_blob:
+            pipe.set(blob_key, _dumps(building_features), ex=ttl, nx=True)
+        for building_id, features in building_features.items():
+            pipe.set(building_features_key(building_id), _dumps(features), ex=ttl, nx=True)
+        pipe.execute()
+    return True
+
+
+def cache_get_raw(key):
+    """Get an already-serialized (possibly gzipped) payload from Redis without parsing it"""
+    client = get_redis_client()
+    if not client:
+        return None
+    return client.get(key) or None
+
+
+def cache_set_raw(key, body, ttl=CACHE_TTL_SECONDS):
+    client = get_redis_client()
+    if not client:
+        return False
+    client.set(key, body, ex=ttl)
+    return True
+
+
+def json_bytes_response(body, status=200):
+    """Build a response from serialized JSON bytes, gzip-compressed when the client accepts it"""
+    if len(body) >= app.config['COMPRESS_MIN_SIZE'] and 'gzip' in request.headers.get('Accept-Encoding', ''):
+        # Setting Content-Encoding makes Flask-Compress leave the body alone
+        response = make_response(gzip.compress(body, compresslevel=3), status)
+        response.headers['Content-Encoding'] = 'gzip'
+    else:
+        response = make_response(body, status)
+    response.headers['Content-Type'] = 'application/json; charset=utf-8'
+    response.headers['Vary'] = 'Accept-Encoding'
+    return response
+
+
+def gzipped_json_response(gz_body, status=200):
+    """Build a response from pre-gzipped JSON bytes, decompressing only for clients without gzip"""
+    if 'gzip' in request.headers.get('Accept-Encoding', ''):
+        response = make_response(gz_body, status)
+        response.headers['Content-Encoding'] = 'gzip'
+    else:
+        response = make_response(gzip.decompress(gz_body), status)
+    response.headers['Content-Type'] = 'application/json; charset=utf-8'
+    response.headers['Vary'] = 'Accept-Encoding'
+    return response
+
+
+def etag_matches(etag):
+    """True when If-None-Match names etag, also in the "<etag>:gzip" form Flask-Compress gives compressed bodies"""
+    return any(tag.split(':', 1)[0] == etag for tag in request.if_none_match.as_set())
+
+
+def mtime_etag(get_paths):
+    """
+    Give a GET endpoint an ETag derived from its URL and the mtime/size of the files its response is
+    built from, answering a matching If-None-Match with an empty 304 before the view runs
+    get_paths: callable returning those files (None or missing entries are allowed)
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            stamps = [request.full_path]
+            for path in get_paths():
+                try:
+                    stat = path.stat()
+                    stamps.append(f'{path}:{stat.st_mtime_ns}:{stat.st_size}')
+                except (AttributeError, OSError):
+                    stamps.append(f'{path}:-')
+            etag = hashlib.blake2b('|'.join(stamps).encode(), digest_size=8).hexdigest()
+            if etag_matches(etag):
+                response = make_response('', 304)
+                response.set_etag(etag)
+                return response
+            response = make_response(view(*args, **kwargs))
+            if response.status_code == 200:
+                response.set_etag(etag)
+                response.headers['Cache-Control'] = 'private, max-age=60'
+            return response
+        return wrapper
+    return decorator
+
+
+def read_building_features_from_parquet(parquet_path: Path, candidate_ids):
+    """
+    Read the features of a single building, letting pyarrow skip row groups
+    whose building_id statistics exclude every candidate ID
+    Returns the features of the first candidate ID found, or None
+    """
+    df = pd.read_parquet(
+        parquet_path,
+        columns=['building_id', 'feature_name', 'value'],
+        filters=[('building_id', 'in', candidate_ids)],
+        engine='pyarrow'
+    )
+    if df.empty:
+        return None
+    df['building_id'] = df['building_id'].astype(str)
+    for candidate_id in candidate_ids:
+        rows = df[df['building_id'] == candidate_id]
+        if not rows.empty:
+            return dict(zip(rows['feature_name'].astype(str).tolist(), rows['value'].tolist()))
+    return None
 
 
 def get_features_cache(file_path):
@@ -90,18 +342,116 @@ def get_features_cache(file_path):
     return features_cache.get(file_path)
 
 
+def bkafi_source_mtime():
+    """Return the mtime of the BKAFI results file on disk, or None if there is none"""
+    path = bkafi_results_path()
+    return path.stat().st_mtime_ns if path is not None else None
+
+
+def bkafi_l1_current():
+    """True when the in-process BKAFI cache matches the results file currently on disk"""
+    return bkafi_cache is not None and _bkafi_source_mtime == bkafi_source_mtime()
+
+
 def get_bkafi_cache():
-    cached = cache_get_json('bkafi:flat')
-    if cached is not None:
-        return cached
-    return bkafi_cache
+    return get_bkafi_caches()[0]
 
 
-def get_bkafi_by_file_cache():
-    cached = cache_get_json('bkafi:by_file')
-    if cached is not None:
-        return cached
-    return getattr(app, 'bkafi_cache_by_file', None)
+def get_bkafi_caches():
+    """
+    Get the flat and per-file BKAFI results of the results file on disk, from this process if warm,
+    else with one Redis round-trip; either is None when neither holds that version of it
+    """
+    if bkafi_l1_current():
+        return bkafi_cache, app.bkafi_cache_by_file
+    source_mtime = bkafi_source_mtime()
+    flat, by_file = [
+        _unpackb(raw) if raw else None
+        for raw in cache_get_raw_many([bkafi_key(BKAFI_FLAT_KEY, source_mtime), bkafi_key(BKAFI_BY_FILE_KEY, source_mtime)])
+    ]
+    if flat is not None and by_file is not None:
+        # Promote into the in-process cache so later requests skip Redis
+        set_bkafi_cache(flat, by_file, source_mtime)
+    return flat, by_file
+
+
+def get_features_and_bkafi_cache(file_path):
+    """
+    Get a file's features and its BKAFI results with at most one Redis round-trip
+    The BKAFI results are the file's own slice when the per-file results list it, else the flat results
+    """
+    file_name = Path(file_path).name
+    if bkafi_l1_current():
+        features = get_features_cache(file_path)
+        by_file, flat = app.bkafi_cache_by_file, bkafi_cache
+    else:
+        features_raw, by_file_raw = cache_get_raw_many(
+            [f'features:{file_path}', bkafi_key(BKAFI_BY_FILE_KEY, bkafi_source_mtime())]
+        )
+        features = _loads(features_raw) if features_raw else features_cache.get(file_path)
+        by_file = _unpackb(by_file_raw) if by_file_raw else None
+        flat = None
+    if by_file and file_name in by_file:
+        return features, by_file[file_name]
+    return features, flat if flat is not None else get_bkafi_cache()
+
+
+def _scan_one_file(file_path, building_id, numeric_id):
+    """Return the data-relative path of file_path if it contains the building, else None"""
+    try:
+        data = load_json_file(file_path)
+        city_objects = data.get('CityObjects', {})
+        
+        # Check if building ID exists in this file
+        for obj_id in city_objects:
+            # Try exact match
+            if obj_id == building_id or obj_id == numeric_id:
+                rel_path = file_path.relative_to(DATA_DIR)
+                logger.debug("Found building %s in %s (exact match)", building_id, rel_path)
+                return str(rel_path)
+            
+            # Try numeric match
+            obj_numeric_match = NUMERIC_ID_RE.search(str(obj_id))
+            if obj_numeric_match and obj_numeric_match.group(1) == numeric_id:
+                rel_path = file_path.relative_to(DATA_DIR)
+                logger.debug("Found building %s in %s (numeric match)", building_id, rel_path)
+                return str(rel_path)
+    except Exception as e:
+        logger.warning("Error reading file %s: %s", file_path, e)
+    return None
+
+
+def scan_for_building_file(source_dirs, building_id, numeric_id):
+    """
+    Scan the JSON files of all source directories concurrently for a building
+    source_dirs: list of (directory, source) pairs in search precedence order
+    Returns (relative_path, source) or (None, None)
+    """
+    file_sources = {}
+    for directory, source in source_dirs:
+        if directory and directory.exists():
+            for file_path in directory.rglob('*.json'):
+                file_sources.setdefault(file_path, source)
+    if not file_sources:
+        return None, None
+    
+    executor = ThreadPoolExecutor(max_workers=min(16, (os.cpu_count() or 1) * 2))
+    try:
+        futures = [
+            (executor.submit(_scan_one_file, file_path, building_id, numeric_id), source)
+            for file_path, source in file_sources.items()
+        ]
+        # Files are read concurrently, but results are taken in precedence order
+        # so the first matching file wins exactly as in a sequential scan
+        for future, source in futures:
+            rel_path = future.result()
+            if rel_path:
+                return rel_path, source
+        return None, None
+    finally:
+        # Drop any scans still queued behind the hit
+        executor.shutdown(wait=False, cancel_futures=True)
+
 
 # Ensure directories exist
 for directory in [DATA_DIR, RESULTS_DIR, SAVED_MODEL_DIR, LOGS_DIR]:
@@ -120,63 +470,55 @@ def demo():
     return render_template('demo.html')
 
 
+def scan_json_files(directory_str):
+    """Yield the DirEntry of every JSON file under a directory, in the same order as Path.rglob('*.json')"""
+    subdirectories = []
+    with os.scandir(directory_str) as entries:
+        for entry in entries:
+            if entry.is_dir():
+                subdirectories.append(entry.path)
+            elif entry.name.endswith('.json'):
+                yield entry
+    for subdirectory in subdirectories:
+        yield from scan_json_files(subdirectory)
+
+
+@functools.lru_cache(maxsize=8)
+def list_json_files(directory_str, dir_mtime_ns):
+    """List the JSON files under a directory; memoized per directory mtime"""
+    # scandir entries carry their name, path and file type, so only the size needs a stat
+    data_prefix = str(DATA_DIR) + os.sep
+    return tuple(
+        {
+            'filename': entry.name,
+            'path': entry.path[len(data_prefix):] if entry.path.startswith(data_prefix) else entry.path,
+            'size': entry.stat().st_size
+        }
+        for entry in scan_json_files(directory_str)
+    )
+
+
 @app.route('/api/data/files')
+@mtime_etag(lambda: [directory for directory, _ in building_source_dirs()])
 def get_files():
     """Get list of available CityJSON files from Source A and Source B"""
     try:
-        # Try different directory name variations
-        source_a_paths = [
-            DATA_DIR / 'RawCitiesData' / 'The Hague' / 'Source A',  # With space
-            DATA_DIR / 'RawCitiesData' / 'The Hague' / 'SourceA',   # Without space
-            DATA_DIR / 'Source A',
-            DATA_DIR / 'SourceA',
-            DATA_DIR
-        ]
-        
-        source_b_paths = [
-            DATA_DIR / 'RawCitiesData' / 'The Hague' / 'Source B',  # With space
-            DATA_DIR / 'RawCitiesData' / 'The Hague' / 'SourceB',   # Without space
-            DATA_DIR / 'Source B',
-            DATA_DIR / 'SourceB',
-            DATA_DIR
-        ]
-        
-        # Find first existing path
-        source_a_path = None
-        for path in source_a_paths:
-            if path.exists():
-                source_a_path = path
-                break
-        
-        source_b_path = None
-        for path in source_b_paths:
-            if path.exists():
-                source_b_path = path
-                break
+        (source_a_path, _), (source_b_path, _) = building_source_dirs()
         
         def get_file_list(directory):
-            files = []
-            if directory.exists() and directory.is_dir():
-                for file_path in directory.rglob('*.json'):
-                    try:
-                        rel_path = file_path.relative_to(DATA_DIR)
-                        files.append({
-                            'filename': file_path.name,
-                            'path': str(rel_path),
-                            'size': file_path.stat().st_size
-                        })
-                    except ValueError:
-                        files.append({
-                            'filename': file_path.name,
-                            'path': str(file_path),
-                            'size': file_path.stat().st_size
-                        })
-            return files
-        
-        return jsonify({
-            'source_a': get_file_list(source_a_path),
-            'source_b': get_file_list(source_b_path)
-        })
+            if not (directory and directory.is_dir()):
+                return []
+            # Keyed by mtime so the cached listing is dropped if the directory changes
+            return list_json_files(str(directory), directory.stat().st_mtime_ns)
+        
+        # Scan both sources concurrently (only matters when the listing is not cached yet)
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            source_a_files = executor.submit(get_file_list, source_a_path)
+            source_b_files = executor.submit(get_file_list, source_b_path)
+            return jsonify({
+                'source_a': source_a_files.result(),
+                'source_b': source_b_files.result()
+            })
     except Exception as e:
         return jsonify({'error': str(e), 'source_a': [], 'source_b': []}), 500
 
@@ -192,21 +534,10 @@ def select_file():
         if not file_path:
             return jsonify({'success': False, 'error': 'No file path provided'}), 400
         
-        full_path = DATA_DIR / file_path
-        if not full_path.exists():
-            alt_paths = [
-                DATA_DIR / 'RawCitiesData' / 'The Hague' / file_path,
-                DATA_DIR / file_path,
-                Path(file_path) if os.path.isabs(file_path) else None
-            ]
-            for alt_path in alt_paths:
-                if alt_path and alt_path.exists():
-                    full_path = alt_path
-                    break
-            else:
-                return jsonify({'success': False, 'error': f'File not found: {file_path}'}), 404
-        
-        import uuid
+        full_path = resolve_data_file(file_path)
+        if full_path is None and not (os.path.isabs(file_path) and Path(file_path).exists()):
+            return jsonify({'success': False, 'error': f'File not found: {file_path}'}), 404
+        
         return jsonify({
             'success': True,
             'session_id': str(uuid.uuid4()),
@@ -217,108 +548,163 @@ def select_file():
         return jsonify({'success': False, 'error': str(e)}), 500
 
 
+def candidate_data_paths(file_path):
+    """Locations a requested data file path may refer to, in order of precedence"""
+    file_name = Path(file_path).name
+    the_hague_dir = DATA_DIR / 'RawCitiesData' / 'The Hague'
+    return [
+        DATA_DIR / file_path,  # Direct path from data directory (most common)
+        # Try with "Source A" (with space)
+        the_hague_dir / 'Source A' / file_name,
+        the_hague_dir / 'Source B' / file_name,
+        # Try with "SourceA" (without space)
+        the_hague_dir / 'SourceA' / file_name,
+        the_hague_dir / 'SourceB' / file_name,
+        # Try if path doesn't include RawCitiesData prefix
+        the_hague_dir / file_path,
+    ]
+
+
+# Every JSON file shipped under DATA_DIR, scanned once at startup
+DATA_FILES = {str(path): path for path in DATA_DIR.rglob('*.json')} if DATA_DIR.exists() else {}
+# Data-relative path -> file, seeded at startup and extended with files that appear later
+PATH_MAP = {path.relative_to(DATA_DIR).as_posix(): path for path in DATA_FILES.values()}
+
+
+def data_relative_path(path):
+    """Canonical path of a file under DATA_DIR, relative to it, as used for PATH_MAP and ETAG_MAP keys"""
+    return path.resolve().relative_to(DATA_DIR.resolve()).as_posix()
+
+
+def resolve_data_file(file_path):
+    """Resolve a requested data file path to a file on disk, or None; stats only for unknown files"""
+    found_path = PATH_MAP.get(file_path)
+    if found_path is not None:
+        return found_path
+    for path in candidate_data_paths(file_path):
+        found_path = DATA_FILES.get(str(path))
+        if found_path is None and path.is_file() and path.resolve().is_relative_to(DATA_DIR.resolve()):
+            # Not present at startup (e.g. a mounted data directory); remember it from now on.
+            # Only files inside DATA_DIR qualify, so '..' or absolute paths can't escape it
+            found_path = path
+        if found_path is not None:
+            # Keyed by the canonical data-relative path, not the requested alias, so the map
+            # holds at most one entry per file however many aliases clients send
+            PATH_MAP.setdefault(data_relative_path(found_path), found_path)
+            return found_path
+    return None
+
+
+# Files are shipped in the image and never change at runtime, so each one is
+# hashed and gzipped once: path -> (etag, gzipped bytes, raw size)
+FILE_CACHE = {}
+# Data-relative file path -> ETag, so conditional GETs are answered before any path probing
+ETAG_MAP = {}
+FILE_CACHE_PREWARM_MAX_BYTES = int(os.getenv('FILE_CACHE_PREWARM_MAX_MB', '16')) * 1024 * 1024
+FILE_CACHE_LRU_SIZE = int(os.getenv('FILE_CACHE_LRU_SIZE', '8'))
+
+
+def load_file_entry(path_str):
+    """Read a CityJSON file once and return (etag, gzipped bytes, raw size)"""
+    raw_bytes = Path(path_str).read_bytes()
+    # Parse only to validate; the client gets the file bytes as they are on disk
+    _loads(raw_bytes)
+    # 64-bit blake2b is plenty to tell file versions apart and keeps the header short
+    etag = hashlib.blake2b(raw_bytes, digest_size=8).hexdigest()
+    return etag, gzip.compress(raw_bytes, compresslevel=6), len(raw_bytes)
+
+
+# Files too large to prewarm are loaded on first request and kept in a small LRU
+load_large_file_entry = functools.lru_cache(maxsize=FILE_CACHE_LRU_SIZE)(load_file_entry)
+
+
+def get_file_entry(path):
+    entry = FILE_CACHE.get(str(path))
+    if entry is None:
+        entry = load_large_file_entry(str(path))
+    return entry
+
+
+def warm_file_cache():
+    """Hash and gzip every small CityJSON file at startup so get_file is a dict lookup"""
+    raw_dir = DATA_DIR / 'RawCitiesData'
+    if not raw_dir.exists():
+        return
+    for path in raw_dir.rglob('*.json'):
+        try:
+            if path.stat().st_size <= FILE_CACHE_PREWARM_MAX_BYTES:
+                FILE_CACHE[str(path)] = load_file_entry(str(path))
+                ETAG_MAP[path.relative_to(DATA_DIR).as_posix()] = FILE_CACHE[str(path)][0]
+        except Exception as e:
+            logger.warning("Could not prewarm %s: %s", path, e)
+    logger.info("Warmed file cache with %s CityJSON files", len(FILE_CACHE))
+
+
+warm_file_cache()
+
+
 @app.route('/api/data/file/<path:file_path>')
 def get_file(file_path):
     """Get CityJSON file content"""
     try:
-        from urllib.parse import unquote
         # URL decode the path manually to ensure it's decoded
         file_path = unquote(str(file_path))
-        print(f"DEBUG: Requested file path: {file_path}")
-        print(f"DEBUG: DATA_DIR: {DATA_DIR}")
-        print(f"DEBUG: DATA_DIR exists: {DATA_DIR.exists()}")
         
-        # Try multiple path combinations
-        file_name = Path(file_path).name
-        possible_paths = [
-            DATA_DIR / file_path,  # Direct path from data directory (most common)
-            # Try with "Source A" (with space)
-            DATA_DIR / 'RawCitiesData' / 'The Hague' / 'Source A' / file_name,
-            DATA_DIR / 'RawCitiesData' / 'The Hague' / 'Source B' / file_name,
-            # Try with "SourceA" (without space)
-            DATA_DIR / 'RawCitiesData' / 'The Hague' / 'SourceA' / file_name,
-            DATA_DIR / 'RawCitiesData' / 'The Hague' / 'SourceB' / file_name,
-            # Try if path doesn't include RawCitiesData prefix
-            DATA_DIR / 'RawCitiesData' / 'The Hague' / file_path,
-        ]
+        # Known path and matching ETag: answer 304 without touching the filesystem
+        if_none_match = request.headers.get('If-None-Match')
+        known_etag = ETAG_MAP.get(file_path)
+        if if_none_match and if_none_match == known_etag:
+            response = make_response('', 304)  # Not Modified
+            response.headers['ETag'] = known_etag
+            return response
+        
+        logger.debug("Requested file path: %s", file_path)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("DATA_DIR: %s (exists: %s)", DATA_DIR, DATA_DIR.exists())
         
-        # Also try if file_path already includes the full structure
-        if 'RawCitiesData' in file_path or 'The Hague' in file_path:
-            # Path already includes the structure, just use it directly
-            possible_paths.insert(0, DATA_DIR / file_path)
-        
-        print(f"DEBUG: Trying {len(possible_paths)} possible paths...")
-        found_path = None
-        for i, path in enumerate(possible_paths):
-            if path:
-                exists = path.exists()
-                is_file = path.is_file() if exists else False
-                print(f"DEBUG: Path {i+1}: {path} - exists: {exists}, is_file: {is_file}")
-                if exists and is_file:
-                    found_path = path
-                    print(f"DEBUG: Found file at: {found_path}")
-                    break
+        found_path = resolve_data_file(file_path)
+        logger.debug("Resolved %s to %s", file_path, found_path)
         
         if not found_path:
             # Log available paths for debugging
-            print(f"ERROR: File not found: {file_path}")
-            print(f"ERROR: Tried paths: {[str(p) for p in possible_paths if p]}")
+            logger.warning("File not found: %s", file_path)
+            tried_paths = [str(p) for p in candidate_data_paths(file_path)]
+            logger.warning("Tried paths: %s", tried_paths)
             # List what's actually in the data directory
-            if DATA_DIR.exists():
-                print(f"DEBUG: Contents of DATA_DIR: {list(DATA_DIR.iterdir())[:10]}")
+            if logger.isEnabledFor(logging.DEBUG) and DATA_DIR.exists():
+                logger.debug("Contents of DATA_DIR: %s", list(DATA_DIR.iterdir())[:10])
             return jsonify({
                 'error': f'File not found: {file_path}',
-                'tried_paths': [str(p) for p in possible_paths if p],
+                'tried_paths': tried_paths,
                 'data_dir': str(DATA_DIR),
                 'data_dir_exists': DATA_DIR.exists()
             }), 404
         
-        # Read and return the JSON file
         # Data is now in the image, so no OneDrive file locking issues
-        print(f"DEBUG: Reading file: {found_path}")
-        file_size = found_path.stat().st_size
-        print(f"DEBUG: File size: {file_size} bytes")
-        
-        # Calculate ETag for caching (based on file path and modification time)
-        mtime = found_path.stat().st_mtime
-        etag = hashlib.md5(f"{found_path}_{mtime}".encode()).hexdigest()
+        # ETag (content hash) and gzipped body were computed once, at warm-up or first request
+        etag, gz_body, file_size = get_file_entry(found_path)
+        # Keyed by the canonical path (not the requested alias) so the map stays one entry per file
+        ETAG_MAP[data_relative_path(found_path)] = etag
+        logger.debug("Serving file: %s (%s bytes)", found_path, file_size)
         
         # Check if client has cached version (If-None-Match header)
-        if_none_match = request.headers.get('If-None-Match')
         if if_none_match == etag:
             response = make_response('', 304)  # Not Modified
             response.headers['ETag'] = etag
             return response
-
-        cache_key = f"cityjson:{file_path}:{etag}"
-        cached_payload = cache_get_json(cache_key)
-        if cached_payload is not None:
-            response = jsonify(cached_payload)
-            response.headers['ETag'] = etag
-            response.headers['Cache-Control'] = 'public, max-age=3600'
-            response.headers['Content-Type'] = 'application/json; charset=utf-8'
-            return response
         
-        with open(found_path, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-            print(f"DEBUG: Successfully loaded JSON, {len(data)} top-level keys")
-            
-            # Create response with caching headers
-            response = jsonify(data)
-            response.headers['ETag'] = etag
-            response.headers['Cache-Control'] = 'public, max-age=3600'  # Cache for 1 hour
-            response.headers['Content-Type'] = 'application/json; charset=utf-8'
-            cache_set_json(cache_key, data)
-            return response
+        # Create response with caching headers
+        response = gzipped_json_response(gz_body)
+        response.headers['ETag'] = etag
+        response.headers['Cache-Control'] = 'public, max-age=3600'  # Cache for 1 hour
+        return response
             
-    except json.JSONDecodeError as e:
-        print(f"ERROR: JSON decode error: {e}")
+    except orjson.JSONDecodeError as e:
+        logger.warning("JSON decode error: %s", e)
         return jsonify({'error': f'Invalid JSON: {str(e)}'}), 400
     except Exception as e:
-        import traceback
         error_trace = traceback.format_exc()
-        print(f"ERROR: Exception in get_file: {e}")
-        print(f"ERROR: Traceback:\n{error_trace}")
+        logger.exception("Exception in get_file: %s", e)
         return jsonify({
             'error': str(e),
             'traceback': error_trace
@@ -336,14 +722,312 @@ def get_file_by_query():
 
 # Global cache for loaded features
 features_cache = {}
+# Building ID / numeric ID -> [relative file path, source], see get_building_file_index()
+building_file_index = None
+_building_index_job = None
+# Per-file building ID alias index: file_path -> (building count, {alias: cached building ID})
+features_index_cache = {}
 # Global cache for BKAFI results
 bkafi_cache = None
+# mtime of the results file the in-process BKAFI cache was loaded from
+_bkafi_source_mtime = None
+# Pair count per results file name of the in-process BKAFI cache
+_bkafi_pairs_per_file = {}
+# (flattened BKAFI dict, {numeric ID: candidate key}) for the dict the index was built from
+_bkafi_numeric_index = (None, {})
+# Memoized /api/buildings/status payloads, keyed by status_memo_key(); bounded because the key
+# embeds the client-supplied file parameter
+_status_cache = LRUCache(maxsize=int(os.getenv('STATUS_LRU_SIZE', '64')))
+_status_cache_lock = threading.Lock()
+
+
+def set_bkafi_cache(flattened_cache, results_dict, source_mtime):
+    """
+    Replace the in-process BKAFI caches and invalidate anything derived from them
+    source_mtime: mtime of the results file the results were loaded from
+    """
+    global bkafi_cache, _bkafi_source_mtime, _bkafi_pairs_per_file
+    bkafi_cache = flattened_cache
+    _bkafi_source_mtime = source_mtime
+    # Also store the original file-based structure for file-specific lookups
+    app.bkafi_cache_by_file = results_dict
+    _bkafi_pairs_per_file = count_pairs_per_file(results_dict) if results_dict else {}
+    with _status_cache_lock:
+        _status_cache.clear()
+
+
+def bkafi_numeric_index(flattened_cache):
+    """Map the numeric part of each BKAFI candidate key to the key; built once per cache dict"""
+    global _bkafi_numeric_index
+    if _bkafi_numeric_index[0] is not flattened_cache:
+        index = {}
+        for candidate_id in flattened_cache:
+            candidate_str = str(candidate_id)
+            index.setdefault(candidate_str, candidate_id)
+            numeric_match = NUMERIC_ID_RE.search(candidate_str)
+            if numeric_match:
+                index.setdefault(numeric_match.group(1), candidate_id)
+        _bkafi_numeric_index = (flattened_cache, index)
+    return _bkafi_numeric_index[1]
+
+
+def find_bkafi_entry(flattened_cache, numeric_id):
+    """Return the BKAFI entry of a candidate building by exact key or by its numeric ID, or None"""
+    building_data = flattened_cache.get(numeric_id)
+    if building_data is None:
+        candidate_id = bkafi_numeric_index(flattened_cache).get(numeric_id)
+        if candidate_id is not None:
+            building_data = flattened_cache[candidate_id]
+    return building_data
+
+
+def match_label_arrays(possible_matches):
+    """
+    Return (confidence, predicted label, true label) arrays for a list of BKAFI matches
+    A missing predicted label is derived from the confidence; a missing true label is -1
+    """
+    count = len(possible_matches)
+    confidence = np.fromiter((match.get('confidence', 0) for match in possible_matches), dtype=np.float64, count=count)
+    predicted = np.fromiter(
+        (np.nan if match.get('predicted_label') is None else match['predicted_label'] for match in possible_matches),
+        dtype=np.float64, count=count
+    )
+    predicted = np.where(np.isnan(predicted), confidence > CONFIDENCE_THRESHOLD, predicted).astype(np.int8)
+    true_label = np.fromiter(
+        (-1 if match.get('true_label') is None else match['true_label'] for match in possible_matches),
+        dtype=np.int64, count=count
+    )
+    return confidence, predicted, true_label
+
+
+def bkafi_results_path():
+    """Return the BKAFI results file to load (JSONL preferred), or None if neither exists"""
+    for path in (DEMO_RESULTS_JSONL, DEMO_RESULTS_JSON):
+        if path.exists():
+            return path
+    return None
+
+
+def load_bkafi_from_disk():
+    """
+    Load BKAFI results from DEMO_RESULTS_JSONL, or DEMO_RESULTS_JSON if there is no JSONL
+    Returns (flattened_cache, results_dict, source_mtime), see data_cache.load_bkafi_results_file;
+    the mtime is taken before reading, so a rewrite during the load is picked up by a later request
+    """
+    path = bkafi_results_path()
+    source_mtime = path.stat().st_mtime_ns
+    return (*load_bkafi_results_file(path), source_mtime)
+
+
+def store_bkafi_results(flattened_cache, results_dict, source_mtime):
+    """Cache BKAFI results loaded from the results file with mtime source_mtime, in this process and in Redis"""
+    set_bkafi_cache(flattened_cache, results_dict, source_mtime)
+    cache_set_mp(bkafi_key(BKAFI_FLAT_KEY, source_mtime), flattened_cache)
+    cache_set_mp(bkafi_key(BKAFI_BY_FILE_KEY, source_mtime), results_dict)
+    cache_set_bkafi_hash(flattened_cache, source_mtime)
+    cache_set_bkafi_pairs(_bkafi_pairs_per_file, source_mtime)
+
+
+def build_building_index(building_features):
+    """
+    Map every normalized form of each cached building ID to that ID:
+    the raw ID, without leading zeros, zero-padded to 16 digits and its numeric part
+    """
+    building_index = {}
+    for building_id in building_features:
+        aliases = [building_id, building_id.lstrip('0'), building_id.zfill(16)]
+        numeric_match = NUMERIC_ID_RE.search(building_id)
+        if numeric_match:
+            aliases.append(numeric_match.group(1))
+        for alias in aliases:
+            if alias:
+                building_index.setdefault(alias, building_id)
+    return building_index
+
+
+def set_features_cache(file_path, building_features):
+    """Store a file's features in the in-process cache together with its ID index"""
+    features_cache[file_path] = building_features
+    features_index_cache[file_path] = (len(building_features), build_building_index(building_features))
+
+
+def get_features_index(file_path, building_features):
+    """Return the ID index for a file's features, rebuilding it if the features changed"""
+    cached = features_index_cache.get(file_path)
+    if cached is None or cached[0] != len(building_features):
+        cached = (len(building_features), build_building_index(building_features))
+        features_index_cache[file_path] = cached
+    return cached[1]
+
+
+@functools.lru_cache(maxsize=8192)
+def extract_numeric_id(building_id):
+    """Extract the numeric part of a building ID (e.g., "bag_0518100000271783" -> "0518100000271783")"""
+    building_id = str(building_id)
+    numeric_match = NUMERIC_ID_RE.search(building_id)
+    if numeric_match:
+        return numeric_match.group(1)
+    # Fallback: try splitting by underscore
+    return building_id.split('_')[-1] if '_' in building_id else building_id
+
+
+@functools.lru_cache(maxsize=8192)
+def building_id_candidates(building_id):
+    """Return (numeric_id, candidate IDs to look up) for a requested building ID"""
+    numeric_id = extract_numeric_id(building_id)
+    # Also try with/without leading zeros
+    candidate_ids = tuple(dict.fromkeys([
+        str(building_id), numeric_id, numeric_id.lstrip('0'), numeric_id.zfill(16)
+    ]))
+    return numeric_id, candidate_ids
+
+
+def load_features_into_cache(file_path):
+    """Build all building features from the parquet and cache them (in-process and Redis) for file_path"""
+    building_features = build_features_from_parquet(FEATURES_PARQUET)
+    set_features_cache(file_path, building_features)
+    cache_set_features(file_path, building_features)
+    return building_features
+
+
+def lookup_building_features(building_features, building_index, candidate_ids):
+    """Return the features of the first candidate ID found in the index, or None"""
+    for candidate_id in candidate_ids:
+        cached_id = building_index.get(candidate_id)
+        if cached_id is not None:
+            return building_features[cached_id]
+    return None
+
+
+def ensure_bkafi_loaded():
+    """
+    Return the (flat, per-file) BKAFI results, loading and caching them from disk on a cold start
+    Returns (None, None) when nothing is cached and there is no results file, or while
+    the startup Celery load is still running (see bkafi_warming())
+    """
+    flattened_cache, results_dict = get_bkafi_caches()
+    if (flattened_cache is None or results_dict is None) and bkafi_results_path() is not None and not bkafi_warming():
+        flattened_cache, results_dict, source_mtime = load_bkafi_from_disk()
+        store_bkafi_results(flattened_cache, results_dict, source_mtime)
+        logger.info("Loaded BKAFI results from: %s", bkafi_results_path())
+    return flattened_cache, results_dict
+
+
+def lookup_bkafi_entry(numeric_id):
+    """
+    Return (BKAFI entry or None, whether BKAFI results are loaded) for one candidate building
+    A worker whose in-process cache is cold reads just that building's hash field from Redis
+    """
+    if not bkafi_l1_current():
+        client = get_redis_client()
+        if client:
+            hash_key = bkafi_key(BKAFI_HASH_KEY, bkafi_source_mtime())
+            with client.pipeline(transaction=False) as pipe:
+                pipe.hget(hash_key, numeric_id)
+                pipe.exists(hash_key)
+                raw, loaded = pipe.execute()
+            if loaded:
+                return (_unpackb(raw) if raw else None), True
+    flattened_cache, _ = ensure_bkafi_loaded()
+    if flattened_cache is None:
+        return None, False
+    return find_bkafi_entry(flattened_cache, numeric_id), True
+
+
+def lookup_bkafi_pairs(file_name):
+    """
+    Return (number of BKAFI pairs of a results file, whether BKAFI results are loaded)
+    A worker whose in-process cache is cold reads the count precomputed at ingest from Redis
+    """
+    if not bkafi_l1_current():
+        client = get_redis_client()
+        if client:
+            pairs_key = bkafi_key(BKAFI_PAIRS_KEY, bkafi_source_mtime())
+            with client.pipeline(transaction=False) as pipe:
+                pipe.hget(pairs_key, file_name)
+                pipe.exists(pairs_key)
+                raw, loaded = pipe.execute()
+            if loaded:
+                return int(raw or 0), True
+    _, results_dict = ensure_bkafi_loaded()
+    if results_dict is None:
+        return 0, False
+    return _bkafi_pairs_per_file.get(file_name, 0), True
+
+
+def bkafi_warming():
+    """True while the BKAFI load queued at startup is waiting for a worker (briefly) or running"""
+    client = get_redis_client()
+    return bool(client and client.exists(BKAFI_WARMING_KEY))
+
+
+def bkafi_warming_response(empty_key):
+    """503 telling the client to retry once the startup BKAFI load has finished"""
+    response = jsonify({
+        'error': 'BKAFI results are still loading. Please retry shortly.',
+        empty_key: []
+    })
+    response.status_code = 503
+    response.headers['Retry-After'] = str(BKAFI_RETRY_AFTER_SECONDS)
+    return response
+
+
+def warm_bkafi_cache():
+    """
+    Warm the BKAFI results at startup so the first request doesn't stall
+    With Redis, take them from Redis or queue a single Celery load shared by all workers;
+    without it, load them from disk into this process
+    """
+    if bkafi_results_path() is None:
+        return
+    try:
+        client = get_redis_client()
+        if not client:
+            set_bkafi_cache(*load_bkafi_from_disk())
+            logger.info("Warmed BKAFI cache with %s candidate buildings", len(bkafi_cache))
+            return
+        flattened_cache, results_dict = get_bkafi_caches()
+        if flattened_cache is not None and results_dict is not None:
+            return
+        # Only the first worker to take the flag queues the load; the task clears it when done
+        if client.set(BKAFI_WARMING_KEY, 1, nx=True, ex=BKAFI_QUEUED_TTL_SECONDS):
+            try:
+                # Under preload_app this runs in the Gunicorn master: publish over a connection of its own,
+                # closed right after, and skip the result backend (nobody waits on the result), so no
+                # broker or backend socket is left for the forked workers to inherit
+                with celery_app.connection_for_write() as connection:
+                    load_bkafi_task.apply_async(ignore_result=True, connection=connection)
+                logger.info("Queued BKAFI load at startup")
+            except Exception:
+                client.delete(BKAFI_WARMING_KEY)
+                raise
+    except Exception as e:
+        logger.warning("Could not warm BKAFI cache: %s", e)
+
+
+warm_bkafi_cache()
+
+
+def warm_features_files():
+    """Create the features parquet and its Arrow IPC copy at startup if the image build did not"""
+    try:
+        if not ensure_features_files(FEATURES_PARQUET, FEATURES_JOBLIB):
+            logger.warning(
+                "Features parquet not found at %s and no joblib file to convert at %s; feature requests will fail",
+                FEATURES_PARQUET, FEATURES_JOBLIB
+            )
+    except Exception as e:
+        logger.warning("Could not prepare the features parquet: %s", e)
+
+
+warm_features_files()
+
 
 @app.route('/api/features/calculate', methods=['POST'])
 def calculate_all_features():
     """
     Calculate geometric features for all buildings in the selected file
-    Loads from joblib file: data/property_dicts/Hague_demo_130425_demo_inference_vector_normalization=True_seed=1.joblib
+    Loads from data/property_dicts/features.parquet (converted from the joblib file at image build or startup)
     """
     try:
         data = request.get_json()
@@ -352,12 +1036,12 @@ def calculate_all_features():
         if not file_path:
             return jsonify({'error': 'No file path provided'}), 400
         
-        print(f"Calculating features for all buildings in file: {file_path}")
+        logger.debug("Calculating features for all buildings in file: %s", file_path)
 
         cache_key = f"features:{file_path}"
         cached_features = cache_get_json(cache_key)
         if cached_features is not None:
-            features_cache[file_path] = cached_features
+            set_features_cache(file_path, cached_features)
             return jsonify({
                 'success': True,
                 'message': f'Features already cached for {file_path}',
@@ -372,86 +1056,18 @@ def calculate_all_features():
                 'message': 'Feature calculation queued'
             }), 202
 
-        if FEATURES_PARQUET.exists():
-            building_features = build_features_from_parquet(FEATURES_PARQUET)
-            features_cache[file_path] = building_features
-            cache_set_json(cache_key, building_features)
-            return jsonify({
-                'success': True,
-                'message': f'Features loaded from parquet for {file_path}',
-                'building_count': len(building_features)
-            })
-        
-        # Load from joblib file
-        joblib_path = DATA_DIR / 'property_dicts' / 'Hague_demo_130425_demo_inference_vector_normalization=True_seed=1.joblib'
-        
-        if not joblib_path.exists():
-            return jsonify({'error': f'Joblib file not found at {joblib_path}'}), 404
-        
-        import joblib
-        import numpy as np
-        with open(joblib_path, 'rb') as f:
-            property_dicts = joblib.load(f)
-        
-        print(f"Loaded property dicts from: {joblib_path}")
-        print(f"Number of features: {len(property_dicts) if isinstance(property_dicts, dict) else 'unknown'}")
-        
-        # Extract all unique building IDs from the 'cands' dictionaries
-        building_ids = set()
-        if isinstance(property_dicts, dict) and len(property_dicts) > 0:
-            first_feature = list(property_dicts.values())[0]
-            if isinstance(first_feature, dict) and 'cands' in first_feature:
-                # Convert all building IDs to strings (handle numpy string types)
-                building_ids = set(str(bid) for bid in first_feature['cands'].keys())
-        
-        print(f"Number of unique buildings: {len(building_ids)}")
-        print(f"Sample building IDs: {list(building_ids)[:5]}")
-        
-        # Reorganize data: convert from feature->building to building->features
-        # This makes it easier to look up features for a specific building
-        building_features = {}
-        for building_id in building_ids:
-            building_id_str = str(building_id)  # Ensure it's a string
-            building_features[building_id_str] = {}
-            for feature_name, feature_data in property_dicts.items():
-                if isinstance(feature_data, dict) and 'cands' in feature_data:
-                    # Try both string and original key format
-                    cands_dict = feature_data['cands']
-                    # Check if building_id exists (try as string and original format)
-                    key_to_use = None
-                    if building_id_str in cands_dict:
-                        key_to_use = building_id_str
-                    else:
-                        # Try to find matching key (handle numpy string types)
-                        for key in cands_dict.keys():
-                            if str(key) == building_id_str:
-                                key_to_use = key
-                                break
-                    
-                    if key_to_use is not None:
-                        value = cands_dict[key_to_use]
-                        # Convert numpy types to Python native types
-                        if isinstance(value, (np.integer, np.floating)):
-                            value = float(value)
-                        elif isinstance(value, np.ndarray):
-                            value = value.tolist()
-                        building_features[building_id_str][feature_name] = value
-        
-        # Store in cache (using the reorganized structure)
-        features_cache[file_path] = building_features
-        cache_set_json(cache_key, building_features)
-        
-        # Return success with count
-        building_count = len(building_features)
+        if not FEATURES_PARQUET.exists():
+            return jsonify({'error': f'Features parquet not found at {FEATURES_PARQUET}'}), 404
+
+        building_features = load_features_into_cache(file_path)
         return jsonify({
             'success': True,
-            'message': f'Features calculated for {building_count} buildings',
-            'building_count': building_count
+            'message': f'Features loaded from parquet for {file_path}',
+            'building_count': len(building_features)
         })
             
     except Exception as e:
-        import traceback
-        print(f"Error calculating features: {e}\n{traceback.format_exc()}")
+        logger.exception("Error calculating features: %s", e)
         return jsonify({'error': str(e)}), 500
 
 
@@ -463,208 +1079,40 @@ def get_building_features(building_id):
     """
     try:
         file_path = request.args.get('file', '')
-        print(f"Getting features for building {building_id} from file {file_path}")
+        logger.debug("Getting features for building %s from file %s", building_id, file_path)
         
-        # First check cache
+        numeric_id, candidate_ids = building_id_candidates(building_id)
+        
+        # Per-building Redis keys answer with one small round-trip instead of the file's whole feature blob
+        for features in cache_get_json_many([building_features_key(candidate_id) for candidate_id in candidate_ids]):
+            if features is not None:
+                logger.debug("Loaded features from Redis for building %s: %s features", building_id, len(features))
+                return jsonify({'building_id': building_id, 'features': features})
+        
+        # Then check the whole-file cache; only load the parquet when this file has no features cached yet
         building_features = get_features_cache(file_path)
-        if building_features:
-            # Try exact match first
-            if isinstance(building_features, dict) and building_id in building_features:
-                features = building_features[building_id]
-                print(f"Loaded features from cache for building {building_id}")
+        if not (isinstance(building_features, dict) and building_features):
+            if not FEATURES_PARQUET.exists():
+                return jsonify({'error': f'Features parquet not found at {FEATURES_PARQUET}', 'features': {}}), 404
+
+            # Fast path: read only this building's rows via a pushed-down filter
+            features = read_building_features_from_parquet(FEATURES_PARQUET, candidate_ids)
+            if features is not None:
+                logger.debug("Loaded features from parquet for building %s: %s features", building_id, len(features))
                 return jsonify({'building_id': building_id, 'features': features})
             
-            # Try to match by extracting numeric ID using regex (handle prefixes like "bag_", "NL.IMBAG.Pand.", etc.)
-            # Extract numeric part from building_id using regex (e.g., "bag_0518100000271783" -> "0518100000271783")
-            # Pattern: find a sequence of digits (10 or more digits for building IDs)
-            numeric_match = re.search(r'(\d{10,})', str(building_id))
-            if numeric_match:
-                numeric_id = numeric_match.group(1)
-            else:
-                # Fallback: try splitting by underscore
-                numeric_id = building_id.split('_')[-1] if '_' in building_id else str(building_id)
-            numeric_id = str(numeric_id)  # Ensure it's a string
-            
-            print(f"Extracted numeric ID: {numeric_id} from building_id: {building_id}")
-            print(f"Available building IDs in cache (first 5): {list(building_features.keys())[:5] if isinstance(building_features, dict) else 'N/A'}")
-            print(f"Total buildings in cache: {len(building_features) if isinstance(building_features, dict) else 0}")
-            
-            if not isinstance(building_features, dict):
-                print("Building features cache is not a dictionary, skipping cache lookup")
-            else:
-                # Try exact match
-                if numeric_id in building_features:
-                    features = building_features[numeric_id]
-                    print(f"Loaded features from cache for building {building_id} (matched as {numeric_id}): {len(features)} features")
-                    return jsonify({'building_id': building_id, 'features': features})
-                
-                # Try to find by string comparison and regex (handle any type mismatches)
-                # Also try with/without leading zeros
-                numeric_id_variants = [
-                    numeric_id,  # Original
-                    numeric_id.lstrip('0'),  # Without leading zeros
-                    numeric_id.zfill(16),  # Padded to 16 digits
-                ]
-                
-                for variant in numeric_id_variants:
-                    # Try exact match with variant
-                    if variant in building_features:
-                        features = building_features[variant]
-                        print(f"Loaded features from cache for building {building_id} (matched variant {variant}): {len(features)} features")
-                        return jsonify({'building_id': building_id, 'features': features})
-                    
-                    # Try to find by string comparison and regex
-                    for cached_id, cached_features in building_features.items():
-                        cached_id_str = str(cached_id)
-                        # Try exact match
-                        if cached_id_str == variant:
-                            print(f"Loaded features from cache for building {building_id} (matched {cached_id} as variant {variant}): {len(cached_features)} features")
-                            return jsonify({'building_id': building_id, 'features': cached_features})
-                        # Try regex match - check if variant is contained in cached_id or vice versa
-                        if re.search(variant, cached_id_str) or re.search(cached_id_str, variant):
-                            print(f"Loaded features from cache for building {building_id} (regex matched {cached_id} with variant {variant}): {len(cached_features)} features")
-                            return jsonify({'building_id': building_id, 'features': cached_features})
-                        # Try partial match - check if the variant ends with cached_id or vice versa
-                        if variant.endswith(cached_id_str) or cached_id_str.endswith(variant):
-                            print(f"Loaded features from cache for building {building_id} (partial match {cached_id} with variant {variant}): {len(cached_features)} features")
-                            return jsonify({'building_id': building_id, 'features': cached_features})
-                
-                # Final check: search through all building IDs to see if any contain the numeric_id
-                print(f"Searching through all {len(building_features)} building IDs in cache for {numeric_id}...")
-                for cached_id, cached_features in building_features.items():
-                    cached_id_str = str(cached_id)
-                    # Check if numeric_id appears anywhere in cached_id
-                    if numeric_id in cached_id_str or cached_id_str in numeric_id:
-                        print(f"Found partial match in cache: {cached_id} contains {numeric_id} or vice versa")
-                        print(f"Loaded features from cache for building {building_id} (found {cached_id}): {len(cached_features)} features")
-                        return jsonify({'building_id': building_id, 'features': cached_features})
-        
-        # Try to load from parquet file if not in cache
-        if FEATURES_PARQUET.exists():
-            building_features = build_features_from_parquet(FEATURES_PARQUET)
-        else:
-            # Fall back to joblib
-            joblib_path = DATA_DIR / 'property_dicts' / 'Hague_demo_130425_demo_inference_vector_normalization=True_seed=1.joblib'
-            
-            if not joblib_path.exists():
-                return jsonify({'error': f'Joblib file not found at {joblib_path}', 'features': {}}), 404
-
-            import joblib
-            import numpy as np
-            with open(joblib_path, 'rb') as f:
-                property_dicts = joblib.load(f)
-            
-            # Extract all unique building IDs
-            building_ids = set()
-            if isinstance(property_dicts, dict) and len(property_dicts) > 0:
-                first_feature = list(property_dicts.values())[0]
-                if isinstance(first_feature, dict) and 'cands' in first_feature:
-                    # Convert all building IDs to strings (handle numpy string types)
-                    building_ids = set(str(bid) for bid in first_feature['cands'].keys())
-            
-            # Reorganize data: convert from feature->building to building->features
-            building_features = {}
-            for bid in building_ids:
-                bid_str = str(bid)  # Ensure it's a string
-                building_features[bid_str] = {}
-                for feature_name, feature_data in property_dicts.items():
-                    if isinstance(feature_data, dict) and 'cands' in feature_data:
-                        cands_dict = feature_data['cands']
-                        # Try both string and original key format
-                        key_to_use = None
-                        if bid_str in cands_dict:
-                            key_to_use = bid_str
-                        else:
-                            # Try to find matching key (handle numpy string types)
-                            for key in cands_dict.keys():
-                                if str(key) == bid_str:
-                                    key_to_use = key
-                                    break
-                        
-                        if key_to_use is not None:
-                            value = cands_dict[key_to_use]
-                            # Convert numpy types to Python native types
-                            if isinstance(value, (np.integer, np.floating)):
-                                value = float(value)
-                            elif isinstance(value, np.ndarray):
-                                value = value.tolist()
-                            building_features[bid_str][feature_name] = value
-            
-        # Store in cache
-        features_cache[file_path] = building_features
-        cache_set_json(f'features:{file_path}', building_features)
-        
-        # Try exact match first
-        if building_id in building_features:
-            features = building_features[building_id]
-            print(f"Loaded features from joblib for building {building_id}: {len(features)} features")
-            return jsonify({'building_id': building_id, 'features': features})
+            building_features = load_features_into_cache(file_path)
         
-        # Try to match by extracting numeric ID using regex (handle prefixes like "bag_", "NL.IMBAG.Pand.", etc.)
-        # Extract numeric part from building_id using regex (e.g., "bag_0518100000271783" -> "0518100000271783")
-        # Pattern: find a sequence of digits (10 or more digits for building IDs)
-        numeric_match = re.search(r'(\d{10,})', str(building_id))
-        if numeric_match:
-            numeric_id = numeric_match.group(1)
-        else:
-            # Fallback: try splitting by underscore
-            numeric_id = building_id.split('_')[-1] if '_' in building_id else str(building_id)
-        numeric_id = str(numeric_id)  # Ensure it's a string
-        
-        print(f"Extracted numeric ID: {numeric_id} from building_id: {building_id}")
-        print(f"Available building IDs in joblib (first 5): {list(building_features.keys())[:5]}")
-        print(f"Total buildings in joblib: {len(building_features)}")
-        
-        # Try exact match
-        if numeric_id in building_features:
-            features = building_features[numeric_id]
-            print(f"Loaded features from joblib for building {building_id} (matched as {numeric_id}): {len(features)} features")
+        # Single O(1) lookup through the alias index, whichever way the features were loaded
+        building_index = get_features_index(file_path, building_features)
+        features = lookup_building_features(building_features, building_index, candidate_ids)
+        if features is not None:
+            logger.debug("Loaded features for building %s: %s features", building_id, len(features))
             return jsonify({'building_id': building_id, 'features': features})
         
-        # Try to find by string comparison and regex (handle any type mismatches)
-        # Also try with/without leading zeros
-        numeric_id_variants = [
-            numeric_id,  # Original
-            numeric_id.lstrip('0'),  # Without leading zeros
-            numeric_id.zfill(16),  # Padded to 16 digits
-        ]
-        
-        for variant in numeric_id_variants:
-            # Try exact match with variant
-            if variant in building_features:
-                features = building_features[variant]
-                print(f"Loaded features from joblib for building {building_id} (matched variant {variant}): {len(features)} features")
-                return jsonify({'building_id': building_id, 'features': features})
-            
-            # Try to find by string comparison and regex
-            for cached_id, cached_features in building_features.items():
-                cached_id_str = str(cached_id)
-                # Try exact match
-                if cached_id_str == variant:
-                    print(f"Loaded features from joblib for building {building_id} (matched {cached_id} as variant {variant}): {len(cached_features)} features")
-                    return jsonify({'building_id': building_id, 'features': cached_features})
-                # Try regex match - check if variant is contained in cached_id or vice versa
-                if re.search(variant, cached_id_str) or re.search(cached_id_str, variant):
-                    print(f"Loaded features from joblib for building {building_id} (regex matched {cached_id} with variant {variant}): {len(cached_features)} features")
-                    return jsonify({'building_id': building_id, 'features': cached_features})
-                # Try partial match - check if the variant ends with cached_id or vice versa
-                if variant.endswith(cached_id_str) or cached_id_str.endswith(variant):
-                    print(f"Loaded features from joblib for building {building_id} (partial match {cached_id} with variant {variant}): {len(cached_features)} features")
-                    return jsonify({'building_id': building_id, 'features': cached_features})
-        
-        # Final check: search through all building IDs to see if any contain the numeric_id
-        print(f"Searching through all {len(building_features)} building IDs for {numeric_id}...")
-        for cached_id, cached_features in building_features.items():
-            cached_id_str = str(cached_id)
-            # Check if numeric_id appears anywhere in cached_id
-            if numeric_id in cached_id_str or cached_id_str in numeric_id:
-                print(f"Found partial match: {cached_id} contains {numeric_id} or vice versa")
-                print(f"Loaded features from joblib for building {building_id} (found {cached_id}): {len(cached_features)} features")
-                return jsonify({'building_id': building_id, 'features': cached_features})
-        
-        # Building not found in joblib - return empty features with a message
-        print(f"WARNING: Building {building_id} (numeric: {numeric_id if 'numeric_id' in locals() else building_id}) not found in joblib file")
-        print("This building may not have features calculated, or it's not in the dataset used for feature calculation")
+        # Building not found in parquet - return empty features with a message
+        logger.warning("Building %s (numeric: %s) not found in features parquet", building_id, numeric_id)
+        logger.warning("This building may not have features calculated, or it's not in the dataset used for feature calculation")
         # Return empty features instead of mock data
         return jsonify({
             'building_id': building_id,
@@ -674,11 +1122,45 @@ def get_building_features(building_id):
         })
             
     except Exception as e:
-        import traceback
-        print(f"Error getting features: {e}\n{traceback.format_exc()}")
+        logger.exception("Error getting features: %s", e)
         return jsonify({'error': str(e), 'features': {}}), 500
 
 
+@app.route('/api/building/features', methods=['POST'])
+def get_building_features_batch():
+    """
+    Get geometric features for many buildings in one call
+    Body: {"file": <selected file path>, "ids": [<building id>, ...]}
+    Returns {building_id: features} with null for buildings without features
+    """
+    try:
+        payload = _loads(request.get_data() or b'{}')
+        file_path = payload.get('file', '')
+        building_ids = payload.get('ids') or []
+        logger.debug("Getting features for %s buildings from file %s", len(building_ids), file_path)
+        
+        building_features = get_features_cache(file_path)
+        if not (isinstance(building_features, dict) and building_features):
+            if not FEATURES_PARQUET.exists():
+                return jsonify({'error': f'Features parquet not found at {FEATURES_PARQUET}'}), 404
+            building_features = load_features_into_cache(file_path)
+        
+        building_index = get_features_index(file_path, building_features)
+        result = {
+            building_id: lookup_building_features(
+                building_features, building_index, building_id_candidates(building_id)[1]
+            )
+            for building_id in map(str, building_ids)
+        }
+        return json_bytes_response(_dumps(result))
+        
+    except orjson.JSONDecodeError as e:
+        return jsonify({'error': f'Invalid JSON: {str(e)}'}), 400
+    except Exception as e:
+        logger.exception("Error getting batch features: %s", e)
+        return jsonify({'error': str(e)}), 500
+
+
 @app.route('/api/bkafi/load', methods=['POST'])
 def load_bkafi_results():
     """
@@ -686,13 +1168,8 @@ def load_bkafi_results():
     Path: results_demo/demo_inference/demo_detailed_results_XGBClassifier_seed1.json
     """
     try:
-        global bkafi_cache
-
-        cached_bkafi = get_bkafi_cache()
-        cached_by_file = get_bkafi_by_file_cache()
+        cached_bkafi, cached_by_file = get_bkafi_caches()
         if cached_bkafi is not None and cached_by_file is not None:
-            bkafi_cache = cached_bkafi
-            app.bkafi_cache_by_file = cached_by_file
             return jsonify({
                 'success': True,
                 'message': 'BKAFI results already cached',
@@ -709,36 +1186,23 @@ def load_bkafi_results():
             }), 202
         
         # Load from JSON file
-        if not DEMO_RESULTS_JSON.exists():
+        if bkafi_results_path() is None:
             return jsonify({'error': f'BKAFI results file not found at {DEMO_RESULTS_JSON}'}), 404
         
-        with open(DEMO_RESULTS_JSON, 'r', encoding='utf-8') as f:
-            results_dict = json.load(f)
+        flattened_cache, results_dict, source_mtime = load_bkafi_from_disk()
+        logger.info("Loaded BKAFI results from: %s", bkafi_results_path())
         
-        print(f"Loaded BKAFI results from: {DEMO_RESULTS_JSON}")
-        
-        # The new structure is file-based: {filename: {building_id: {possible_matches: [...]}}}
-        # Flatten it for easier lookup: merge all buildings from all files
-        flattened_cache = {}
         total_pairs = 0
         unique_candidates = 0
-        
-        for file_name, file_buildings in results_dict.items():
-            for building_id, building_data in file_buildings.items():
-                flattened_cache[building_id] = building_data
+        for file_buildings in results_dict.values():
+            for building_data in file_buildings.values():
                 unique_candidates += 1
                 total_pairs += len(building_data.get('possible_matches', []))
         
-        print(f"Number of candidate buildings: {unique_candidates} across {len(results_dict)} files")
+        logger.info("Number of candidate buildings: %s across %s files", unique_candidates, len(results_dict))
         
         # Store in global cache (flattened dictionary structure for backward compatibility)
-        bkafi_cache = flattened_cache
-        # Also store the original file-based structure for file-specific lookups
-        if not hasattr(app, 'bkafi_cache_by_file'):
-            app.bkafi_cache_by_file = results_dict
-
-        cache_set_json('bkafi:flat', flattened_cache)
-        cache_set_json('bkafi:by_file', results_dict)
+        store_bkafi_results(flattened_cache, results_dict, source_mtime)
         
         return jsonify({
             'success': True,
@@ -747,13 +1211,11 @@ def load_bkafi_results():
             'unique_candidates': int(unique_candidates)
         })
             
-    except json.JSONDecodeError as e:
-        import traceback
-        print(f"Error parsing JSON: {e}\n{traceback.format_exc()}")
+    except orjson.JSONDecodeError as e:
+        logger.exception("Error parsing JSON: %s", e)
         return jsonify({'error': f'Invalid JSON format: {str(e)}'}), 500
     except Exception as e:
-        import traceback
-        print(f"Error loading BKAFI results: {e}\n{traceback.format_exc()}")
+        logger.exception("Error loading BKAFI results: %s", e)
         return jsonify({'error': str(e)}), 500
 
 
@@ -776,18 +1238,142 @@ def get_features_result():
     file_path = request.args.get('file_path', '')
     if not file_path:
         return jsonify({'error': 'No file path provided'}), 400
-    cached = cache_get_json(f'features:{file_path}')
+    cached = cache_get_raw(f'features:{file_path}')
     if cached is None:
         return jsonify({'error': 'Features not found in cache'}), 404
-    return jsonify({'file_path': file_path, 'features': cached})
+    # Splice the cached JSON bytes into the envelope instead of parsing and re-serializing them
+    return json_bytes_response(b'{"file_path":' + _dumps(file_path) + b',"features":' + cached + b'}')
 
 
 @app.route('/api/bkafi/result', methods=['GET'])
 def get_bkafi_result():
-    cached = cache_get_json('bkafi:flat')
+    cached = cache_get_mp(bkafi_key(BKAFI_FLAT_KEY, bkafi_source_mtime()))
     if cached is None:
         return jsonify({'error': 'BKAFI results not found in cache'}), 404
-    return jsonify({'bkafi': cached})
+    return json_bytes_response(_dumps({'bkafi': cached}))
+
+
+# Recently extracted single-building bodies, checked before Redis to skip the round-trip.
+# Bodies range from a few KB to several MB, so the cache is bounded by total bytes, not entries
+SINGLE_BUILDING_LRU = LRUCache(
+    maxsize=int(os.getenv('SINGLE_BUILDING_LRU_MB', '64')) * 1024 * 1024,
+    getsizeof=len
+)
+# cachetools caches are not thread-safe and gthread workers share them across request threads
+SINGLE_BUILDING_LOCK = threading.Lock()
+
+
+def cached_single_building(cache_key):
+    """Return a single-building body from the in-process LRU, or None"""
+    with SINGLE_BUILDING_LOCK:
+        return SINGLE_BUILDING_LRU.get(cache_key)
+
+
+def remember_single_building(cache_key, body):
+    """Keep a single-building body in the in-process LRU unless it alone exceeds the byte budget"""
+    # The size check and the insert (which may evict several entries) happen under one lock
+    with SINGLE_BUILDING_LOCK:
+        if len(body) <= SINGLE_BUILDING_LRU.maxsize:
+            SINGLE_BUILDING_LRU[cache_key] = body
+
+
+def geometry_boundary_rings(geometry):
+    """Return the vertex-index rings of a Solid or MultiSurface geometry, or None for other types"""
+    boundaries = geometry.get('boundaries')
+    if not boundaries:
+        return None
+    if geometry.get('type') == 'Solid':
+        return [ring for shell in boundaries for face in shell for ring in face]
+    if geometry.get('type') == 'MultiSurface':
+        return [ring for surface in boundaries for ring in surface]
+    return None
+
+
+def rebuild_boundaries(geometry, rings):
+    """Nest rings (an iterator, consumed in order) back into the boundary shape of geometry"""
+    if geometry.get('type') == 'Solid':
+        return [[[next(rings) for _ in face] for face in shell] for shell in geometry['boundaries']]
+    return [[next(rings) for _ in surface] for surface in geometry['boundaries']]
+
+
+def vertex_sidecar_path(found_path):
+    """Return the path of the per-building sidecar stored next to a CityJSON file"""
+    return found_path.with_suffix('.vidx.npz')
+
+
+def build_vertex_sidecar(city_json):
+    """
+    Split a parsed CityJSON into the arrays of its sidecar:
+    header (version/metadata/transform plus per-object offsets), objects (each CityObject as JSON bytes),
+    vertex_indices (each object's sorted unique vertex indices, int32) and vertices
+    """
+    header = {key: city_json[key] for key in ('version', 'metadata', 'transform') if key in city_json}
+    offsets = {}
+    aliases = {}
+    object_blobs = []
+    index_arrays = []
+    obj_pos = idx_pos = 0
+    for obj_id, obj_data in city_json.get('CityObjects', {}).items():
+        blob = _dumps(obj_data)
+        rings = [ring for geometry in obj_data.get('geometry', []) for ring in geometry_boundary_rings(geometry) or ()]
+        flat_indices = np.fromiter(itertools.chain.from_iterable(rings), dtype=np.int64)
+        vertex_indices = np.unique(flat_indices[flat_indices >= 0]).astype(np.int32)
+        offsets[obj_id] = [obj_pos, obj_pos + len(blob), idx_pos, idx_pos + len(vertex_indices)]
+        obj_pos += len(blob)
+        idx_pos += len(vertex_indices)
+        object_blobs.append(blob)
+        index_arrays.append(vertex_indices)
+        numeric_match = NUMERIC_ID_RE.search(obj_id)
+        if numeric_match:
+            aliases.setdefault(numeric_match.group(1), obj_id)
+    header['objects'] = offsets
+    header['aliases'] = aliases
+    # Vertices are quantized ints when the file has a transform
+    vertex_dtype = np.int64 if 'transform' in city_json else np.float64
+    return {
+        'header': header,
+        'objects': np.frombuffer(b''.join(object_blobs), dtype=np.uint8),
+        'vertex_indices': np.concatenate(index_arrays) if index_arrays else np.empty(0, dtype=np.int32),
+        'vertices': np.asarray(city_json.get('vertices', []), dtype=vertex_dtype)
+    }
+
+
+@functools.lru_cache(maxsize=FILE_CACHE_LRU_SIZE)
+def _load_vertex_sidecar(path_str, mtime_ns):
+    """Load (or build and save) the sidecar of a CityJSON file; memoized per file mtime"""
+    found_path = Path(path_str)
+    sidecar_path = vertex_sidecar_path(found_path)
+    try:
+        if sidecar_path.stat().st_mtime_ns >= mtime_ns:
+            with np.load(sidecar_path) as npz:
+                sidecar = {key: npz[key] for key in npz.files}
+            sidecar['header'] = _loads(sidecar['header'].tobytes())
+            return sidecar
+    except FileNotFoundError:
+        pass
+    except Exception as e:
+        logger.warning("Ignoring unreadable sidecar %s: %s", sidecar_path, e)
+    
+    sidecar = build_vertex_sidecar(load_json_file(found_path))
+    tmp_path = None
+    try:
+        # A temporary file of its own per writer: threads of one process may build the same sidecar at once
+        with tempfile.NamedTemporaryFile(dir=sidecar_path.parent, prefix=f'{sidecar_path.name}.', suffix='.tmp',
+                                         delete=False) as f:
+            tmp_path = Path(f.name)
+            np.savez(f, **{**sidecar, 'header': np.frombuffer(_dumps(sidecar['header']), dtype=np.uint8)})
+        os.replace(tmp_path, sidecar_path)
+        logger.info("Wrote building sidecar %s", sidecar_path)
+    except OSError as e:
+        logger.warning("Could not write building sidecar %s: %s", sidecar_path, e)
+        if tmp_path is not None:
+            tmp_path.unlink(missing_ok=True)
+    return sidecar
+
+
+def get_vertex_sidecar(found_path):
+    """Return the per-building sidecar of a CityJSON file, building it on first use"""
+    return _load_vertex_sidecar(str(found_path), found_path.stat().st_mtime_ns)
 
 
 @app.route('/api/building/single/<building_id>')
@@ -797,133 +1383,84 @@ def get_single_building(building_id):
     Query params: file (the file path containing the building)
     """
     try:
-        import re
         file_path = request.args.get('file', '')
         if not file_path:
             return jsonify({'error': 'No file path provided'}), 400
         
-        print(f"Extracting single building {building_id} from file {file_path}")
+        logger.debug("Extracting single building %s from file %s", building_id, file_path)
 
         cache_key = f"building:{file_path}:{building_id}"
-        cached_building = cache_get_json(cache_key)
+        cached_building = cached_single_building(cache_key)
+        if cached_building is None:
+            cached_building = cache_get_raw(cache_key)
+            if cached_building is not None:
+                remember_single_building(cache_key, cached_building)
         if cached_building is not None:
-            return jsonify(cached_building)
+            return json_bytes_response(cached_building)
         
         # Find the file
-        file_name = Path(file_path).name
-        possible_paths = [
-            DATA_DIR / file_path,
-            DATA_DIR / 'RawCitiesData' / 'The Hague' / 'Source A' / file_name,
-            DATA_DIR / 'RawCitiesData' / 'The Hague' / 'Source B' / file_name,
-            DATA_DIR / 'RawCitiesData' / 'The Hague' / 'SourceA' / file_name,
-            DATA_DIR / 'RawCitiesData' / 'The Hague' / 'SourceB' / file_name,
-            DATA_DIR / 'RawCitiesData' / 'The Hague' / file_path,
-        ]
-        
-        if 'RawCitiesData' in file_path or 'The Hague' in file_path:
-            possible_paths.insert(0, DATA_DIR / file_path)
-        
-        found_path = None
-        for path in possible_paths:
-            if path and path.exists() and path.is_file():
-                found_path = path
-                break
-        
+        found_path = resolve_data_file(file_path)
         if not found_path:
             return jsonify({'error': f'File not found: {file_path}'}), 404
         
-        # Load the CityJSON file
-        with open(found_path, 'r', encoding='utf-8') as f:
-            city_json = json.load(f)
+        # Per-building objects and vertex indices come from the file's sidecar,
+        # so the CityJSON itself is only parsed once
+        sidecar = get_vertex_sidecar(found_path)
+        header = sidecar['header']
         
         # Extract numeric ID for matching
-        numeric_match = re.search(r'(\d{10,})', str(building_id))
-        numeric_id = numeric_match.group(1) if numeric_match else building_id.split('_')[-1] if '_' in building_id else str(building_id)
-        numeric_id = str(numeric_id)
+        numeric_id = extract_numeric_id(building_id)
         
-        # Find the building in CityObjects
-        target_building_id = None
-        target_building = None
+        # Find the building: exact ID, bare numeric ID, then numeric part of the object ID
+        objects = header['objects']
+        target_building_id = next(
+            (obj_id for obj_id in (building_id, numeric_id, header['aliases'].get(numeric_id)) if obj_id in objects),
+            None
+        )
         
-        for obj_id, obj_data in city_json.get('CityObjects', {}).items():
-            # Try exact match
-            if obj_id == building_id or obj_id == numeric_id:
-                target_building_id = obj_id
-                target_building = obj_data
-                break
-            
-            # Try numeric match
-            obj_numeric_match = re.search(r'(\d{10,})', str(obj_id))
-            if obj_numeric_match:
-                obj_numeric = obj_numeric_match.group(1)
-                if obj_numeric == numeric_id:
-                    target_building_id = obj_id
-                    target_building = obj_data
-                    break
-        
-        if not target_building:
+        if target_building_id is None:
             return jsonify({'error': f'Building {building_id} not found in file {file_path}'}), 404
+        obj_start, obj_end, idx_start, idx_end = objects[target_building_id]
+        target_building = _loads(sidecar['objects'][obj_start:obj_end].tobytes())
         
-        # Extract all vertex indices used by this building
-        vertex_indices = set()
-        
-        def collect_vertex_indices(geometry):
-            if geometry.get('type') == 'Solid' and geometry.get('boundaries'):
-                for shell in geometry['boundaries']:
-                    for face in shell:
-                        for ring in face:
-                            for vertex_idx in ring:
-                                if isinstance(vertex_idx, int) and vertex_idx >= 0:
-                                    vertex_indices.add(vertex_idx)
-            elif geometry.get('type') == 'MultiSurface' and geometry.get('boundaries'):
-                for surface in geometry['boundaries']:
-                    for ring in surface:
-                        for vertex_idx in ring:
-                            if isinstance(vertex_idx, int) and vertex_idx >= 0:
-                                vertex_indices.add(vertex_idx)
-        
+        # Collect every vertex index used by this building into one flat array
         geometries = target_building.get('geometry', [])
-        for geometry in geometries:
-            collect_vertex_indices(geometry)
-        
-        # Create a mapping from old indices to new indices
-        sorted_indices = sorted(vertex_indices)
-        index_mapping = {old_idx: new_idx for new_idx, old_idx in enumerate(sorted_indices)}
-        
-        # Extract only the vertices we need
-        all_vertices = city_json.get('vertices', [])
-        new_vertices = [all_vertices[i] for i in sorted_indices if i < len(all_vertices)]
-        
-        # Update geometry to use new vertex indices
-        def remap_geometry(geometry):
-            new_geometry = geometry.copy()
-            if new_geometry.get('type') == 'Solid' and new_geometry.get('boundaries'):
-                new_geometry['boundaries'] = [
-                    [
-                        [
-                            [index_mapping.get(v_idx, v_idx) for v_idx in ring]
-                            for ring in face
-                        ]
-                        for face in shell
-                    ]
-                    for shell in new_geometry['boundaries']
-                ]
-            elif new_geometry.get('type') == 'MultiSurface' and new_geometry.get('boundaries'):
-                new_geometry['boundaries'] = [
-                    [
-                        [index_mapping.get(v_idx, v_idx) for v_idx in ring]
-                        for ring in surface
-                    ]
-                    for surface in new_geometry['boundaries']
-                ]
-            return new_geometry
-        
-        new_geometries = [remap_geometry(geom) for geom in geometries]
+        geometry_rings = [geometry_boundary_rings(geometry) for geometry in geometries]
+        all_rings = [ring for rings in geometry_rings if rings for ring in rings]
+        ring_lengths = [len(ring) for ring in all_rings]
+        flat_indices = np.fromiter(itertools.chain.from_iterable(all_rings), dtype=np.int64, count=sum(ring_lengths))
+        used = flat_indices >= 0
+        sorted_unique = sidecar['vertex_indices'][idx_start:idx_end].astype(np.int64)
+        
+        # Old index -> new index is the position in the sorted set of used indices
+        remapped = np.where(used, np.searchsorted(sorted_unique, flat_indices), flat_indices).tolist()
+        
+        # Extract only the vertices we need with a single vectorized gather
+        all_vertices = sidecar['vertices']
+        # Kept as an ndarray: orjson serializes it directly without boxing each coordinate
+        new_vertices = all_vertices[sorted_unique[sorted_unique < len(all_vertices)]]
+        
+        # Cut the remapped indices back into rings and rebuild each geometry around them
+        new_rings = []
+        position = 0
+        for length in ring_lengths:
+            new_rings.append(remapped[position:position + length])
+            position += length
+        new_rings = iter(new_rings)
+        new_geometries = []
+        for geometry, rings in zip(geometries, geometry_rings):
+            if not rings:
+                new_geometries.append(geometry)
+                continue
+            # Share every other member (semantics, lod, ...) with the source geometry
+            new_geometry = {key: value for key, value in geometry.items() if key != 'boundaries'}
+            new_geometry['boundaries'] = rebuild_boundaries(geometry, new_rings)
+            new_geometries.append(new_geometry)
         
         # Create minimal CityJSON with only this building
         minimal_cityjson = {
             'type': 'CityJSON',
-            'version': city_json.get('version', '1.0'),
+            'version': header.get('version', '1.0'),
             'CityObjects': {
                 target_building_id: {
                     **target_building,
@@ -934,23 +1471,115 @@ def get_single_building(building_id):
         }
         
         # Preserve metadata if available
-        if 'metadata' in city_json:
-            minimal_cityjson['metadata'] = city_json['metadata']
+        if 'metadata' in header:
+            minimal_cityjson['metadata'] = header['metadata']
         
         # Preserve transform if available
-        if 'transform' in city_json:
-            minimal_cityjson['transform'] = city_json['transform']
+        if 'transform' in header:
+            minimal_cityjson['transform'] = header['transform']
         
-        print(f"Created minimal CityJSON with 1 building and {len(new_vertices)} vertices")
-        cache_set_json(cache_key, minimal_cityjson)
-        return jsonify(minimal_cityjson)
+        logger.debug("Created minimal CityJSON with 1 building and %s vertices", len(new_vertices))
+        body = orjson.dumps(minimal_cityjson, option=orjson.OPT_SERIALIZE_NUMPY)
+        remember_single_building(cache_key, body)
+        cache_set_raw(cache_key, body)
+        return json_bytes_response(body)
         
     except Exception as e:
-        import traceback
-        print(f"Error extracting single building: {e}\n{traceback.format_exc()}")
+        logger.exception("Error extracting single building: %s", e)
         return jsonify({'error': str(e)}), 500
 
 
+def building_source_dirs():
+    """Return [(directory, source)] for Source A and Source B in search precedence order"""
+    # Get source paths (also the directories get_files lists)
+    source_a_paths = [
+        DATA_DIR / 'RawCitiesData' / 'The Hague' / 'Source A',
+        DATA_DIR / 'RawCitiesData' / 'The Hague' / 'SourceA',
+        DATA_DIR / 'Source A',
+        DATA_DIR / 'SourceA',
+        DATA_DIR
+    ]
+    
+    source_b_paths = [
+        DATA_DIR / 'RawCitiesData' / 'The Hague' / 'Source B',
+        DATA_DIR / 'RawCitiesData' / 'The Hague' / 'SourceB',
+        DATA_DIR / 'Source B',
+        DATA_DIR / 'SourceB',
+        DATA_DIR
+    ]
+    
+    # Find first existing path
+    source_a_path = None
+    for path in source_a_paths:
+        if path.exists():
+            source_a_path = path
+            break
+    
+    source_b_path = None
+    for path in source_b_paths:
+        if path.exists():
+            source_b_path = path
+            break
+    
+    return [(source_a_path, 'A'), (source_b_path, 'B')]
+
+
+def get_building_file_index():
+    """
+    Return the building ID -> [relative path, source] index, or None while it is being built
+    With Redis the index is built once by a Celery task and shared by all workers;
+    without it the index is built in-process on first use
+    """
+    global building_file_index, _building_index_job
+    if building_file_index is not None:
+        return building_file_index
+    cached = cache_get_mp(BUILDING_FILE_INDEX_KEY)
+    if cached is not None:
+        building_file_index = cached
+        # Scan results memoized during warm-up are no longer needed
+        _scan_building_file.cache_clear()
+        return building_file_index
+    source_dirs = building_source_dirs()
+    if get_redis_client():
+        if _building_index_job is None or _building_index_job.failed():
+            _building_index_job = build_building_file_index_task.delay(
+                [(str(directory), source) for directory, source in source_dirs if directory]
+            )
+        return None
+    building_file_index = index_building_files(source_dirs)
+    logger.info("Indexed %s building IDs across source files", len(building_file_index))
+    return building_file_index
+
+
+@functools.lru_cache(maxsize=4096)
+def _scan_building_file(building_id, numeric_id):
+    """
+    Scan the source files for a building while the building index is not available yet
+    Memoized since the data files are baked into the image; cleared once the index is loaded
+    """
+    logger.debug("Building index not ready, scanning files for %s (numeric: %s)", building_id, numeric_id)
+    # Scan Source A and Source B files in parallel; Source A still wins
+    # when a building exists in both sources
+    return scan_for_building_file(building_source_dirs(), building_id, numeric_id)
+
+
+def _resolve_building_file(building_id):
+    """
+    Find which file contains a specific building ID
+    Returns (relative_path, source) or (None, None)
+    """
+    # Extract numeric ID from building_id
+    numeric_id = extract_numeric_id(building_id)
+    
+    # Checked on every call, so an ID first looked up during warm-up resolves once the index arrives
+    index = get_building_file_index()
+    if index is not None:
+        entry = index.get(building_id) or index.get(numeric_id)
+        return tuple(entry) if entry else (None, None)
+    
+    return _scan_building_file(building_id, numeric_id)
+
+
 @app.route('/api/building/find-file/<building_id>')
 def find_building_file(building_id):
     """
@@ -958,96 +1587,12 @@ def find_building_file(building_id):
     Searches through Source A and Source B files
     """
     try:
-        import re
-        # Extract numeric ID from building_id
-        numeric_match = re.search(r'(\d{10,})', str(building_id))
-        if numeric_match:
-            numeric_id = numeric_match.group(1)
-        else:
-            numeric_id = building_id.split('_')[-1] if '_' in building_id else str(building_id)
-        numeric_id = str(numeric_id)
-        
-        print(f"Searching for building {building_id} (numeric: {numeric_id}) in files...")
-        
-        # Get source paths (same logic as get_files)
-        source_a_paths = [
-            DATA_DIR / 'RawCitiesData' / 'The Hague' / 'Source A',
-            DATA_DIR / 'RawCitiesData' / 'The Hague' / 'SourceA',
-            DATA_DIR / 'Source A',
-            DATA_DIR / 'SourceA',
-            DATA_DIR
-        ]
-        
-        source_b_paths = [
-            DATA_DIR / 'RawCitiesData' / 'The Hague' / 'Source B',
-            DATA_DIR / 'RawCitiesData' / 'The Hague' / 'SourceB',
-            DATA_DIR / 'Source B',
-            DATA_DIR / 'SourceB',
-            DATA_DIR
-        ]
-        
-        # Find first existing path
-        source_a_path = None
-        for path in source_a_paths:
-            if path.exists():
-                source_a_path = path
-                break
-        
-        source_b_path = None
-        for path in source_b_paths:
-            if path.exists():
-                source_b_path = path
-                break
-        
-        # Search through files
-        def search_in_directory(directory, source_type):
-            if not directory or not directory.exists():
-                return None
-            
-            for file_path in directory.rglob('*.json'):
-                try:
-                    with open(file_path, 'r', encoding='utf-8') as f:
-                        data = json.load(f)
-                        city_objects = data.get('CityObjects', {})
-                        
-                        # Check if building ID exists in this file
-                        for obj_id, obj_data in city_objects.items():
-                            # Try exact match
-                            if obj_id == building_id or obj_id == numeric_id:
-                                rel_path = file_path.relative_to(DATA_DIR)
-                                print(f"Found building {building_id} in {rel_path} (exact match)")
-                                return str(rel_path)
-                            
-                            # Try numeric match
-                            obj_numeric_match = re.search(r'(\d{10,})', str(obj_id))
-                            if obj_numeric_match:
-                                obj_numeric = obj_numeric_match.group(1)
-                                if obj_numeric == numeric_id:
-                                    rel_path = file_path.relative_to(DATA_DIR)
-                                    print(f"Found building {building_id} in {rel_path} (numeric match)")
-                                    return str(rel_path)
-                except Exception as e:
-                    print(f"Error reading file {file_path}: {e}")
-                    continue
-            
-            return None
-        
-        # Search in Source A first
-        file_path = search_in_directory(source_a_path, 'A')
+        file_path, source = _resolve_building_file(str(building_id))
         if file_path:
             return jsonify({
                 'building_id': building_id,
                 'file_path': file_path,
-                'source': 'A'
-            })
-        
-        # Search in Source B
-        file_path = search_in_directory(source_b_path, 'B')
-        if file_path:
-            return jsonify({
-                'building_id': building_id,
-                'file_path': file_path,
-                'source': 'B'
+                'source': source
             })
         
         # Not found
@@ -1059,8 +1604,7 @@ def find_building_file(building_id):
         }), 404
         
     except Exception as e:
-        import traceback
-        print(f"Error finding building file: {e}\n{traceback.format_exc()}")
+        logger.exception("Error finding building file: %s", e)
         return jsonify({'error': str(e)}), 500
 
 
@@ -1073,55 +1617,25 @@ def get_building_bkafi(building_id):
     """
     try:
         file_path = request.args.get('file', '')
-        print(f"Getting BKAFI pairs for building {building_id} from file {file_path}")
-        
-        bkafi_cache_local = get_bkafi_cache()
-        if bkafi_cache_local is None:
-            # Try to load synchronously if not cached
-            if DEMO_RESULTS_JSON.exists():
-                with open(DEMO_RESULTS_JSON, 'r', encoding='utf-8') as f:
-                    results_dict = json.load(f)
-                flattened_cache = {}
-                for file_name, file_buildings in results_dict.items():
-                    for building_id, building_data in file_buildings.items():
-                        flattened_cache[building_id] = building_data
-                bkafi_cache_local = flattened_cache
-                cache_set_json('bkafi:flat', flattened_cache)
-                cache_set_json('bkafi:by_file', results_dict)
-                print(f"Loaded BKAFI results from: {DEMO_RESULTS_JSON}")
-            else:
-                return jsonify({
-                    'error': 'BKAFI results not loaded. Please run Step 2 first.',
-                    'pairs': []
-                }), 404
+        logger.debug("Getting BKAFI pairs for building %s from file %s", building_id, file_path)
         
         # Extract numeric ID from building_id (handle prefixes like "bag_")
-        import re
-        numeric_match = re.search(r'(\d{10,})', str(building_id))
-        if numeric_match:
-            numeric_id = numeric_match.group(1)
-        else:
-            numeric_id = building_id.split('_')[-1] if '_' in building_id else str(building_id)
-        numeric_id = str(numeric_id)
-        
-        print(f"Looking for pairs for candidate building: {numeric_id}")
+        numeric_id = extract_numeric_id(building_id)
         
-        # Lookup candidate building in dictionary (try exact match first)
-        building_data = bkafi_cache_local.get(numeric_id)
+        logger.debug("Looking for pairs for candidate building: %s", numeric_id)
         
-        # If no exact match, try to find by string comparison
-        if building_data is None:
-            for candidate_id in bkafi_cache_local.keys():
-                if str(candidate_id) == numeric_id:
-                    building_data = bkafi_cache_local[candidate_id]
-                    break
-                # Also try if numeric_id is contained in candidate_id or vice versa
-                if numeric_id in str(candidate_id) or str(candidate_id) in numeric_id:
-                    building_data = bkafi_cache_local[candidate_id]
-                    break
+        # Lookup candidate building (exact key, then numeric part of the key)
+        building_data, bkafi_loaded = lookup_bkafi_entry(numeric_id)
+        if not bkafi_loaded:
+            if bkafi_warming():
+                return bkafi_warming_response('pairs')
+            return jsonify({
+                'error': 'BKAFI results not loaded. Please run Step 2 first.',
+                'pairs': []
+            }), 404
         
         if building_data is None:
-            print(f"No pairs found for building {building_id} (numeric: {numeric_id})")
+            logger.debug("No pairs found for building %s (numeric: %s)", building_id, numeric_id)
             return jsonify({
                 'building_id': building_id,
                 'pairs': [],
@@ -1130,7 +1644,7 @@ def get_building_bkafi(building_id):
         
         # Extract possible_matches array
         possible_matches = building_data.get('possible_matches', [])
-        print(f"Found {len(possible_matches)} pairs for building {building_id} (numeric: {numeric_id})")
+        logger.debug("Found %s pairs for building %s (numeric: %s)", len(possible_matches), building_id, numeric_id)
         
         if len(possible_matches) == 0:
             return jsonify({
@@ -1139,20 +1653,19 @@ def get_building_bkafi(building_id):
                 'message': f'No BKAFI pairs found for building {building_id}'
             })
         
-        # Convert to list of dictionaries
-        pairs = []
-        for match in possible_matches:
-            pair = {
+        # Convert to list of dictionaries, sorted by confidence (descending) instead of prediction
+        confidence, predicted, true_label = match_label_arrays(possible_matches)
+        confidence_list, predicted_list, true_list = confidence.tolist(), predicted.tolist(), true_label.tolist()
+        pairs = [
+            {
                 'candidate_id': numeric_id,
-                'index_id': str(match.get('index_id', '')),
-                'prediction': int(match.get('predicted_label', 0)) if match.get('predicted_label') is not None else (1 if match.get('confidence', 0) > CONFIDENCE_THRESHOLD else 0),
-                'true_label': int(match.get('true_label', 0)) if match.get('true_label') is not None else None,
-                'confidence': float(match.get('confidence', 0))
+                'index_id': str(possible_matches[i].get('index_id', '')),
+                'prediction': predicted_list[i],
+                'true_label': true_list[i] if true_list[i] >= 0 else None,
+                'confidence': confidence_list[i]
             }
-            pairs.append(pair)
-        
-        # Sort by confidence (descending) instead of prediction
-        pairs.sort(key=lambda x: x.get('confidence', 0), reverse=True)
+            for i in np.argsort(-confidence, kind='stable').tolist()
+        ]
         
         return jsonify({
             'building_id': building_id,
@@ -1161,8 +1674,7 @@ def get_building_bkafi(building_id):
         })
             
     except Exception as e:
-        import traceback
-        print(f"Error getting BKAFI pairs: {e}\n{traceback.format_exc()}")
+        logger.exception("Error getting BKAFI pairs: %s", e)
         return jsonify({'error': str(e), 'pairs': []}), 500
 
 
@@ -1175,50 +1687,20 @@ def get_building_matches(building_id):
     """
     try:
         file_path = request.args.get('file', '')
-        print(f"Getting matches for building {building_id} from file {file_path}")
-        
-        bkafi_cache_local = get_bkafi_cache()
-        if bkafi_cache_local is None:
-            # Try to load if not cached
-            if DEMO_RESULTS_JSON.exists():
-                with open(DEMO_RESULTS_JSON, 'r', encoding='utf-8') as f:
-                    results_dict = json.load(f)
-                # Flatten the file-based structure
-                flattened_cache = {}
-                for file_name, file_buildings in results_dict.items():
-                    for building_id, building_data in file_buildings.items():
-                        flattened_cache[building_id] = building_data
-                bkafi_cache_local = flattened_cache
-                cache_set_json('bkafi:flat', flattened_cache)
-                cache_set_json('bkafi:by_file', results_dict)
-                print(f"Loaded BKAFI results from: {DEMO_RESULTS_JSON}")
-            else:
-                return jsonify({
-                    'error': 'BKAFI results not loaded. Please run Step 2 first.',
-                    'matches': []
-                }), 404
+        logger.debug("Getting matches for building %s from file %s", building_id, file_path)
         
         # Extract numeric ID from building_id
-        import re
-        numeric_match = re.search(r'(\d{10,})', str(building_id))
-        if numeric_match:
-            numeric_id = numeric_match.group(1)
-        else:
-            numeric_id = building_id.split('_')[-1] if '_' in building_id else str(building_id)
-        numeric_id = str(numeric_id)
+        numeric_id = extract_numeric_id(building_id)
         
-        # Lookup candidate building in dictionary
-        building_data = bkafi_cache_local.get(numeric_id)
-        
-        # If no exact match, try to find by string comparison
-        if building_data is None:
-            for candidate_id in bkafi_cache_local.keys():
-                if str(candidate_id) == numeric_id:
-                    building_data = bkafi_cache_local[candidate_id]
-                    break
-                if numeric_id in str(candidate_id) or str(candidate_id) in numeric_id:
-                    building_data = bkafi_cache_local[candidate_id]
-                    break
+        # Lookup candidate building (exact key, then numeric part of the key)
+        building_data, bkafi_loaded = lookup_bkafi_entry(numeric_id)
+        if not bkafi_loaded:
+            if bkafi_warming():
+                return bkafi_warming_response('matches')
+            return jsonify({
+                'error': 'BKAFI results not loaded. Please run Step 2 first.',
+                'matches': []
+            }), 404
         
         if building_data is None:
             return jsonify({
@@ -1229,29 +1711,21 @@ def get_building_matches(building_id):
         
         # Extract possible_matches and filter for predicted matches (predicted_label=1 or confidence > threshold)
         possible_matches = building_data.get('possible_matches', [])
-        matches = []
-        
-        for match in possible_matches:
-            # Get predicted_label or calculate from confidence
-            predicted_label = match.get('predicted_label')
-            if predicted_label is None:
-                predicted_label = 1 if match.get('confidence', 0) > CONFIDENCE_THRESHOLD else 0
-            else:
-                predicted_label = int(predicted_label)
-            
-            # Only include matches with predicted_label=1
-            if predicted_label == 1:
-                match_data = {
-                    'id': match.get('index_id', ''),
-                    'building_id': str(match.get('index_id', '')),
-                    'source': 'Source B',  # Index buildings are from Source B
-                    'confidence': float(match.get('confidence', 0)),
-                    'true_label': int(match.get('true_label', 0)) if match.get('true_label') is not None else None
-                }
-                matches.append(match_data)
-        
-        # Sort by confidence (descending)
-        matches.sort(key=lambda x: x.get('confidence', 0), reverse=True)
+        confidence, predicted, true_label = match_label_arrays(possible_matches)
+        
+        # Only include matches with predicted_label=1, sorted by confidence (descending)
+        order = np.argsort(-confidence, kind='stable')
+        confidence_list, true_list = confidence.tolist(), true_label.tolist()
+        matches = [
+            {
+                'id': possible_matches[i].get('index_id', ''),
+                'building_id': str(possible_matches[i].get('index_id', '')),
+                'source': 'Source B',  # Index buildings are from Source B
+                'confidence': confidence_list[i],
+                'true_label': true_list[i] if true_list[i] >= 0 else None
+            }
+            for i in order[predicted[order] == 1].tolist()
+        ]
         
         return jsonify({
             'building_id': building_id,
@@ -1259,11 +1733,35 @@ def get_building_matches(building_id):
         })
             
     except Exception as e:
-        import traceback
-        print(f"Error getting matches: {e}\n{traceback.format_exc()}")
+        logger.exception("Error getting matches: %s", e)
         return jsonify({'error': str(e), 'matches': []}), 500
 
 
+def status_memo_key(file_path):
+    """
+    Fingerprint the inputs of a file's building status without loading them: whether the file's
+    features and the BKAFI results are available, and the mtimes of the files they come from
+    """
+    features_present = file_path in features_cache
+    bkafi_loaded = bkafi_l1_current()
+    client = get_redis_client()
+    if client and not (features_present and bkafi_loaded):
+        with client.pipeline(transaction=False) as pipe:
+            pipe.exists(f'features:{file_path}')
+            pipe.exists(bkafi_key(BKAFI_FLAT_KEY, bkafi_source_mtime()))
+            features_in_redis, bkafi_in_redis = pipe.execute()
+        features_present = features_present or bool(features_in_redis)
+        bkafi_loaded = bkafi_loaded or bool(bkafi_in_redis)
+    features_mtime = None
+    if features_present:
+        try:
+            features_mtime = FEATURES_PARQUET.stat().st_mtime_ns
+        except OSError:
+            features_mtime = 'cached'
+    bkafi_mtime = bkafi_source_mtime() if bkafi_loaded else None
+    return f'status:{file_path}:{features_mtime}:{bkafi_mtime}'
+
+
 @app.route('/api/buildings/status', methods=['GET'])
 def get_all_buildings_status():
     """
@@ -1276,110 +1774,149 @@ def get_all_buildings_status():
         if not file_path:
             return jsonify({'error': 'No file path provided'}), 400
         
-        print(f"Getting status for all buildings in file: {file_path}")
+        logger.debug("Getting status for all buildings in file: %s", file_path)
         
-        result = {}
+        # Look the payload up by a cheap fingerprint of its inputs before loading any of them
+        status_key = status_memo_key(file_path)
+        with _status_cache_lock:
+            cached_status = _status_cache.get(status_key)
+        if cached_status is None:
+            # Shared across workers
+            cached_status = cache_get_raw(status_key)
+            if cached_status is not None:
+                with _status_cache_lock:
+                    _status_cache[status_key] = cached_status
+        if cached_status is not None:
+            return json_bytes_response(cached_status)
+        
+        features_data, bkafi_data = get_features_and_bkafi_cache(file_path)
         
         # 1. Check which buildings have features
         has_features = set()
-        features_data = get_features_cache(file_path)
         if isinstance(features_data, dict):
             has_features = set(features_data.keys())
         
         # 2. Check which buildings have BKAFI pairs
         has_pairs = set()
-        bkafi_data = get_bkafi_cache()
         if bkafi_data is not None:
-            # Get all unique candidate building IDs from dictionary keys
-            for candidate_id in bkafi_data.keys():
-                bid_str = str(candidate_id)
-                has_pairs.add(bid_str)
-                # Also add numeric version for matching
-                numeric_match = re.search(r'(\d{10,})', bid_str)
-                if numeric_match:
-                    has_pairs.add(numeric_match.group(1))
+            # Extract the numeric form of every candidate building ID in one
+            # vectorized pass instead of running the regex per key
+            candidate_ids = pd.Series(list(bkafi_data.keys()), dtype=object).astype(str)
+            numeric_ids = candidate_ids.str.extract(r'(\d{10,})', expand=False)
+            has_pairs = set(candidate_ids.tolist()) | set(numeric_ids.dropna().tolist())
         
         # 3. Check match status (true match, false positive, no match)
         # For each building, check all its pairs to determine overall status
         match_status = {}  # building_id -> 'true_match', 'false_positive', 'no_match'
         if bkafi_data is not None:
-            # Iterate over dictionary keys (candidate building IDs)
-            for candidate_id, building_data in bkafi_data.items():
-                source_id_str = str(candidate_id)
-                
-                # Get possible_matches array
-                possible_matches = building_data.get('possible_matches', [])
-                building_has_pairs = len(possible_matches) > 0
-                
-                # Check all pairs for this building
-                has_true_match = False
-                has_false_positive = False
-                
-                for match in possible_matches:
-                    # Get predicted_label or calculate from confidence
-                    predicted_label = match.get('predicted_label')
-                    if predicted_label is None:
-                        predicted_label = 1 if match.get('confidence', 0) > CONFIDENCE_THRESHOLD else 0
-                    else:
-                        predicted_label = int(predicted_label)
-                    
-                    # Get true_label (do not use is_match as it's redundant)
-                    true_label = match.get('true_label')
-                    if true_label is not None:
-                        true_label = int(true_label)
-                    
-                    if predicted_label == 1:
-                        if true_label == 1:
-                            has_true_match = True
-                        elif true_label == 0:
-                            has_false_positive = True
-                
-                # Determine overall status for this building based on ALL pairs
-                # Priority: true_match > false_positive > no_match
-                if has_true_match:
-                    status = 'true_match'  # At least one pair with predicted_label=1 and true_label=1
-                elif has_false_positive:
-                    status = 'false_positive'  # At least one pair with predicted_label=1 and true_label=0
-                elif building_has_pairs:
-                    # Has pairs but all predictions are 0, or prediction=1 with unknown true_label
-                    status = 'no_match'
-                else:
-                    status = None  # No pairs at all - keep previous stage color
-                
-                # Store for both full ID and numeric ID
-                numeric_match = re.search(r'(\d{10,})', source_id_str)
-                numeric_id = numeric_match.group(1) if numeric_match else None
-                
-                if status:
-                    match_status[source_id_str] = status
-                    if numeric_id:
-                        match_status[numeric_id] = status
-        
-        # Combine all building IDs
-        all_building_ids = has_features.union(has_pairs).union(match_status.keys())
-        
-        # Build result
-        for building_id in all_building_ids:
-            building_id_str = str(building_id)
-            result[building_id_str] = {
-                'has_features': building_id_str in has_features,
-                'has_pairs': building_id_str in has_pairs,
-                'match_status': match_status.get(building_id_str, None)
-            }
+            # Derive the labels of every pair of every building in one vectorized pass
+            buildings = list(bkafi_data.values())
+            pair_counts = np.fromiter(
+                (len(building_data.get('possible_matches', [])) for building_data in buildings),
+                dtype=np.int64, count=len(buildings)
+            )
+            _, predicted, true_label = match_label_arrays(
+                [match for building_data in buildings for match in building_data.get('possible_matches', [])]
+            )
+            owner = np.repeat(np.arange(len(buildings)), pair_counts)
+            positive = predicted == 1
+            has_true_match = np.bincount(owner[positive & (true_label == 1)], minlength=len(buildings)) > 0
+            has_false_positive = np.bincount(owner[positive & (true_label == 0)], minlength=len(buildings)) > 0
+            
+            # Determine overall status for each building based on ALL its pairs
+            # Priority: true_match > false_positive > no_match; buildings without
+            # pairs keep None (previous stage color)
+            statuses = np.full(len(buildings), None, dtype=object)
+            statuses[pair_counts > 0] = 'no_match'
+            statuses[has_false_positive] = 'false_positive'
+            statuses[has_true_match] = 'true_match'
+            
+            # Store for both full ID and numeric ID, reusing the extraction above
+            statuses = pd.Series(statuses, index=candidate_ids.index, dtype=object)
+            with_status = statuses.notna()
+            match_status.update(zip(candidate_ids[with_status], statuses[with_status]))
+            with_numeric = with_status & numeric_ids.notna()
+            match_status.update(zip(numeric_ids[with_numeric], statuses[with_numeric]))
+        
+        # Every building falls into one of a few (has_features, has_pairs, match_status)
+        # classes: resolve membership with bulk set arithmetic and let each class share
+        # one row dict, leaving a per-ID step only for buildings with a match status
+        rows = {
+            (features, pairs, status): {'has_features': features, 'has_pairs': pairs, 'match_status': status}
+            for features in (True, False)
+            for pairs in (True, False)
+            for status in (None, 'true_match', 'false_positive', 'no_match')
+        }
+        labeled = match_status.keys()
+        result = dict.fromkeys(has_features - has_pairs - labeled, rows[True, False, None])
+        result.update(dict.fromkeys((has_features & has_pairs) - labeled, rows[True, True, None]))
+        result.update(dict.fromkeys(has_pairs - has_features - labeled, rows[False, True, None]))
+        result.update({
+            building_id: rows[building_id in has_features, building_id in has_pairs, status]
+            for building_id, status in match_status.items()
+        })
         
-        return jsonify({
+        payload = {
             'success': True,
             'buildings': result,
             'total': len(result)
-        })
+        }
+        body = _dumps(payload)
+        with _status_cache_lock:
+            _status_cache[status_key] = body
+        cache_set_raw(status_key, body)
+        return json_bytes_response(body)
         
     except Exception as e:
-        import traceback
-        print(f"Error getting building status: {e}\n{traceback.format_exc()}")
+        logger.exception("Error getting building status: %s", e)
         return jsonify({'error': str(e)}), 500
 
 
+# Serialized classifier summaries, keyed by (metrics mtime, BKAFI results mtime, file name)
+SUMMARY_LRU = LRUCache(maxsize=int(os.getenv('SUMMARY_LRU_SIZE', '128')))
+SUMMARY_LOCK = threading.Lock()
+
+
+@functools.lru_cache(maxsize=2)
+def load_metrics_summary(mtime_ns):
+    """
+    Parse the metrics summary and index each model's file metrics by key and by basename
+    Returns (metrics_data, {model_name: {key or basename: file metrics}}); memoized per file mtime
+    """
+    metrics_data = load_json_file(DEMO_METRICS_JSON)
+    file_indexes = {}
+    for model_name, model_metrics in metrics_data.items():
+        file_metrics = model_metrics.get('file_metrics', {}) if isinstance(model_metrics, dict) else {}
+        index = dict(file_metrics)
+        for key, value in file_metrics.items():
+            index.setdefault(Path(key).name, value)
+        file_indexes[model_name] = index
+    return metrics_data, file_indexes
+
+
+@functools.lru_cache(maxsize=1024)
+def find_file_metrics(mtime_ns, model_name, file_name):
+    """Return a model's metrics for a file by exact key or basename, else the first partial key match"""
+    index = load_metrics_summary(mtime_ns)[1].get(model_name, {})
+    if file_name in index:
+        return index[file_name]
+    return next((value for key, value in index.items() if file_name in key or key in file_name), None)
+
+
+def warm_metrics_summary():
+    """Parse and index the metrics summary at startup so the first summary request doesn't pay for it"""
+    try:
+        if DEMO_METRICS_JSON.exists():
+            load_metrics_summary(DEMO_METRICS_JSON.stat().st_mtime_ns)
+    except Exception as e:
+        logger.warning("Could not warm metrics summary: %s", e)
+
+
+warm_metrics_summary()
+
+
 @app.route('/api/classifier/summary', methods=['GET'])
+@mtime_etag(lambda: [DEMO_METRICS_JSON, bkafi_results_path()])
 def get_classifier_summary():
     """
     Get classifier results summary with success rates calculated per file
@@ -1390,33 +1927,32 @@ def get_classifier_summary():
         if not file_path:
             return jsonify({'error': 'No file path provided'}), 400
         
-        print(f"Getting classifier summary for file: {file_path}")
+        logger.debug("Getting classifier summary for file: %s", file_path)
         
-        # Load metrics summary JSON
-        if not DEMO_METRICS_JSON.exists():
+        # Load metrics summary JSON (parsed once per file version; one stat per request)
+        try:
+            metrics_mtime_ns = DEMO_METRICS_JSON.stat().st_mtime_ns
+        except FileNotFoundError:
             return jsonify({'error': f'Metrics summary file not found at {DEMO_METRICS_JSON}'}), 404
-        
-        with open(DEMO_METRICS_JSON, 'r', encoding='utf-8') as f:
-            metrics_data = json.load(f)
+        metrics_data = load_metrics_summary(metrics_mtime_ns)[0]
         
         # Extract model metrics (XGBClassifier)
         model_name = 'XGBClassifier'
         if model_name not in metrics_data:
             return jsonify({'error': f'Model {model_name} not found in metrics file'}), 404
         
-        model_metrics = metrics_data[model_name]
-        file_metrics = model_metrics.get('file_metrics', {})
-        
         # Get file name to match against file_metrics keys
         file_name = Path(file_path).name
         
-        # Find matching file in file_metrics (try exact match first, then partial)
-        file_metric_data = None
-        for key in file_metrics.keys():
-            if key == file_name or file_name in key or key in file_name:
-                file_metric_data = file_metrics[key]
-                print(f"Found metrics for file: {key}")
-                break
+        # The summary only depends on the metrics file, the BKAFI results file and the file name
+        summary_key = (metrics_mtime_ns, bkafi_source_mtime(), file_name)
+        with SUMMARY_LOCK:
+            cached_summary = SUMMARY_LRU.get(summary_key)
+        if cached_summary is not None:
+            return json_bytes_response(cached_summary)
+        
+        # Find matching file in file_metrics (exact key or basename first, then partial)
+        file_metric_data = find_file_metrics(metrics_mtime_ns, model_name, file_name)
         
         if not file_metric_data:
             return jsonify({'error': f'No metrics found for file: {file_name}'}), 404
@@ -1454,19 +1990,10 @@ def get_classifier_summary():
         # Calculate found true matches (true positives for threshold)
         found_true_matches = threshold_true_positives
         
-        # Calculate total pairs from detailed results (need to load BKAFI cache for this)
-        bkafi_by_file = get_bkafi_by_file_cache()
-        if bkafi_by_file is None and DEMO_RESULTS_JSON.exists():
-            with open(DEMO_RESULTS_JSON, 'r', encoding='utf-8') as f:
-                results_dict = json.load(f)
-            bkafi_by_file = results_dict
-            cache_set_json('bkafi:by_file', results_dict)
-        
-        # Count total pairs for this file
-        total_pairs = 0
-        if bkafi_by_file and file_name in bkafi_by_file:
-            for building_data in bkafi_by_file[file_name].values():
-                total_pairs += len(building_data.get('possible_matches', []))
+        # Total pairs for this file, counted once when the BKAFI results were loaded
+        total_pairs, bkafi_loaded = lookup_bkafi_pairs(file_name)
+        if not bkafi_loaded and bkafi_warming():
+            return bkafi_warming_response('summary')
         
         # Get total buildings in file
         candidates_in_file = file_metric_data.get('candidates_in_file', 0)
@@ -1525,18 +2052,19 @@ def get_classifier_summary():
             'best_match_false_positives': best_match_false_positives
         }
         
-        return jsonify({
+        body = _dumps({
             'success': True,
             'summary': summary
         })
+        with SUMMARY_LOCK:
+            SUMMARY_LRU[summary_key] = body
+        return json_bytes_response(body)
         
-    except json.JSONDecodeError as e:
-        import traceback
-        print(f"Error parsing JSON: {e}\n{traceback.format_exc()}")
+    except orjson.JSONDecodeError as e:
+        logger.exception("Error parsing JSON: %s", e)
         return jsonify({'error': f'Invalid JSON format: {str(e)}'}), 500
     except Exception as e:
-        import traceback
-        print(f"Error getting classifier summary: {e}\n{traceback.format_exc()}")
+        logger.exception("Error getting classifier summary: %s", e)
         return jsonify({'error': str(e)}), 500
 
 
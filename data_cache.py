@@ -0,0 +1,197 @@
+"""
+Data loading and Redis cache helpers shared by the Flask app (app.py) and the Celery worker (tasks.py)
+"""
+import os
+import re
+import threading
+from pathlib import Path
+
+import msgpack
+import numpy as np
+import orjson
+import pandas as pd
+import pyarrow as pa
+import pyarrow.feather as feather
+import pyarrow.parquet as pq
+
+# Building IDs carry a 10+ digit numeric BAG ID, possibly with a prefix/suffix
+NUMERIC_ID_RE = re.compile(r'(\d{10,})')
+# MessagePack blobs of the flat and the per-file BKAFI results
+BKAFI_FLAT_KEY = 'mp:bkafi:flat'
+BKAFI_BY_FILE_KEY = 'mp:bkafi:by_file'
+# The flat BKAFI results as a hash with one MessagePack field per candidate (and its numeric ID),
+# so a cold web worker can HGET a single building instead of decoding the whole blob
+BKAFI_HASH_KEY = 'mp:bkafi:by_id'
+# Fields sent per pipeline round-trip when filling the hash
+BKAFI_HASH_CHUNK_SIZE = 1000
+# Number of BKAFI pairs per results file name, counted once at ingest for the classifier summary
+BKAFI_PAIRS_KEY = 'bkafi:pairs_per_file'
+
+
+def building_features_key(building_id):
+    """
+    Redis key of one building's features; the features table is global, so the key does not depend on
+    the file the building was requested for and every file shares one copy
+    """
+    return f'features:building:{building_id}'
+
+
+def bkafi_key(key, source_mtime):
+    """
+    Redis key under which a BKAFI cache entry loaded from the results file with mtime source_mtime is stored
+    A rewritten results file gets new keys, so the old results are never read back (they expire with their TTL)
+    """
+    return f'{key}:{source_mtime}'
+
+
+def _tmp_path(path: Path):
+    """Temporary name next to path, unique per process and thread, for writes published with os.replace"""
+    return path.with_name(f'{path.name}.{os.getpid()}.{threading.get_ident()}.tmp')
+
+
+def ensure_features_files(parquet_path: Path, joblib_path: Path):
+    """
+    Make sure the features parquet and its Arrow IPC copy exist when the image build did not create them:
+    converts the joblib property dicts when only those ship, and writes a missing Arrow copy from the parquet
+    Returns True when the parquet is available
+    """
+    arrow_path = parquet_path.with_suffix('.arrow')
+    if parquet_path.exists():
+        if not arrow_path.exists():
+            tmp_arrow = _tmp_path(arrow_path)
+            try:
+                feather.write_feather(pq.read_table(parquet_path), tmp_arrow, compression='uncompressed')
+                os.replace(tmp_arrow, arrow_path)
+            finally:
+                tmp_arrow.unlink(missing_ok=True)
+        return True
+    if not joblib_path.exists():
+        return False
+    # Imported here: the converter pulls in joblib, which only this fallback needs
+    from scripts.convert_joblib_to_parquet import convert
+    tmp_parquet, tmp_arrow = _tmp_path(parquet_path), _tmp_path(arrow_path)
+    try:
+        convert(joblib_path, tmp_parquet, tmp_arrow)
+        # Arrow copy first, so the parquet never appears without it
+        os.replace(tmp_arrow, arrow_path)
+        os.replace(tmp_parquet, parquet_path)
+    finally:
+        tmp_parquet.unlink(missing_ok=True)
+        tmp_arrow.unlink(missing_ok=True)
+    return True
+
+
+def read_features_table(parquet_path: Path):
+    """Read the whole features table, from the uncompressed Arrow IPC copy next to the parquet when present"""
+    arrow_path = parquet_path.with_suffix('.arrow')
+    if arrow_path.exists():
+        # Memory-mapped and undecoded: every process shares the same page cache pages
+        with pa.memory_map(str(arrow_path), 'r') as source:
+            return pa.ipc.open_file(source).read_all().select(['building_id', 'feature_name', 'value'])
+    # Memory-map the file so the columns are decoded straight from the page cache
+    return pq.read_table(parquet_path, columns=['building_id', 'feature_name', 'value'], memory_map=True)
+
+
+def build_features_from_parquet(parquet_path: Path):
+    """Return {building_id: {feature_name: value}} for every building in the features table"""
+    table = read_features_table(parquet_path)
+    # The converter writes string IDs and dictionary-encoded names; casting in Arrow is a no-op
+    # for those and decodes older files without a Python str() call per row
+    building_id_column = table['building_id'].cast(pa.string()).to_numpy()
+    # Integer-code the buildings and stable-sort the rows by code, so each building's
+    # features are one contiguous slice of plain lists; this skips the per-group
+    # overhead of a pandas groupby, which dominates with a handful of rows per building
+    codes, building_ids = pd.factorize(building_id_column)
+    order = np.argsort(codes, kind='stable')
+    feature_names = table['feature_name'].cast(pa.string()).to_numpy()[order].tolist()
+    values = table['value'].to_numpy()[order].tolist()
+    ends = np.cumsum(np.bincount(codes, minlength=len(building_ids))).tolist()
+    starts = [0] + ends[:-1]
+    return {
+        building_id: dict(zip(feature_names[start:end], values[start:end]))
+        for building_id, start, end in zip(building_ids.tolist(), starts, ends)
+    }
+
+
+def write_bkafi_hash(client, flattened_cache, source_mtime, ttl):
+    """
+    Store each BKAFI candidate as its own field of the BKAFI_HASH_KEY hash of the results file version
+    The hash is filled under a staging key in pipelined chunks and renamed into place, so readers
+    never see a partially written hash
+    """
+    hash_key = bkafi_key(BKAFI_HASH_KEY, source_mtime)
+    staging_key = f'{hash_key}:staging'
+    client.delete(staging_key)
+    items = list(flattened_cache.items())
+    for chunk_start in range(0, len(items), BKAFI_HASH_CHUNK_SIZE):
+        with client.pipeline(transaction=False) as pipe:
+            for candidate_id, building_data in items[chunk_start:chunk_start + BKAFI_HASH_CHUNK_SIZE]:
+                candidate_id = str(candidate_id)
+                blob = msgpack.packb(building_data, use_bin_type=True)
+                pipe.hset(staging_key, candidate_id, blob)
+                numeric_match = NUMERIC_ID_RE.search(candidate_id)
+                if numeric_match and numeric_match.group(1) != candidate_id:
+                    pipe.hsetnx(staging_key, numeric_match.group(1), blob)
+            pipe.execute()
+    if not items:
+        client.delete(hash_key)
+        return
+    with client.pipeline(transaction=True) as pipe:
+        pipe.expire(staging_key, ttl)
+        pipe.rename(staging_key, hash_key)
+        pipe.execute()
+
+
+def count_pairs_per_file(results_dict):
+    """Total number of BKAFI pairs of each results file: {file name: pair count}"""
+    return {
+        file_name: sum(len(building_data.get('possible_matches', ())) for building_data in file_buildings.values())
+        for file_name, file_buildings in results_dict.items()
+    }
+
+
+def write_bkafi_pairs(client, pairs_per_file, source_mtime, ttl):
+    """Replace the BKAFI_PAIRS_KEY hash of the results file version with the per-file pair counts"""
+    pairs_key = bkafi_key(BKAFI_PAIRS_KEY, source_mtime)
+    with client.pipeline(transaction=True) as pipe:
+        pipe.delete(pairs_key)
+        if pairs_per_file:
+            pipe.hset(pairs_key, mapping=pairs_per_file)
+            pipe.expire(pairs_key, ttl)
+        pipe.execute()
+
+
+def iter_bkafi_results(path):
+    """Yield (file_name, building_id, building_data) from a BKAFI results file (.jsonl or .json)"""
+    if path.suffix == '.jsonl':
+        # Streamed line by line: only one building is parsed at a time
+        with open(path, 'rb') as f:
+            for line in f:
+                if line.strip():
+                    record = orjson.loads(line)
+                    yield record['file'], record['bid'], record['data']
+        return
+    with open(path, 'rb') as f:
+        results_dict = orjson.loads(f.read())
+    for file_name, file_buildings in results_dict.items():
+        for building_id, building_data in file_buildings.items():
+            yield file_name, building_id, building_data
+
+
+def load_bkafi_results_file(path):
+    """
+    Load a BKAFI results file
+    Returns (flattened_cache, results_dict): a flat {building_id: building_data} merge of all files
+    and the file-based structure {filename: {building_id: {possible_matches: [...]}}}
+    """
+    flattened_cache = {}
+    results_dict = {}
+    # Rows arrive grouped by file, so each file's dict is looked up once per file, not per building
+    current_file = file_buildings = None
+    for file_name, building_id, building_data in iter_bkafi_results(path):
+        if file_name != current_file:
+            current_file = file_name
+            file_buildings = results_dict.setdefault(file_name, {})
+        file_buildings[building_id] = building_data
+        flattened_cache[building_id] = building_data
+    return flattened_cache, results_dict
@@ -1,12 +1,33 @@
 import os
+import sys
 
 workers = int(os.getenv("GUNICORN_WORKERS", "4"))
-threads = int(os.getenv("GUNICORN_THREADS", "2"))
+# Handlers mostly wait on Redis and disk, so each worker serves requests from a thread pool
+worker_class = os.getenv("GUNICORN_WORKER_CLASS", "gthread")
+threads = int(os.getenv("GUNICORN_THREADS", str(max(4, os.cpu_count() or 2))))
+keepalive = int(os.getenv("GUNICORN_KEEPALIVE", "5"))
 timeout = int(os.getenv("GUNICORN_TIMEOUT", "180"))
 bind = os.getenv("GUNICORN_BIND", "0.0.0.0:5000")
 
 max_requests = int(os.getenv("GUNICORN_MAX_REQUESTS", "1000"))
 max_requests_jitter = int(os.getenv("GUNICORN_MAX_REQUESTS_JITTER", "50"))
 
+# Import the app once in the master so the startup caches (file cache, BKAFI, metrics index)
+# are built a single time and shared copy-on-write by every worker
+preload_app = os.getenv("GUNICORN_PRELOAD", "1") == "1"
+
 accesslog = "-"
 errorlog = "-"
+
+
+def post_fork(server, worker):
+    # Redis sockets must not be shared across forked workers; give each worker its own pools
+    tasks = sys.modules.get("tasks")
+    if tasks is not None:
+        tasks.reset_redis_pool()
+        # The master publishes over its own short-lived connection, so this normally finds nothing
+        # open; it makes sure a worker never reuses a broker socket created before the fork
+        tasks.celery.pool.force_close_all()
+    app = sys.modules.get("app")
+    if app is not None:
+        app._redis_client = None
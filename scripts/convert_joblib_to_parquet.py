@@ -3,44 +3,82 @@ import argparse
 from pathlib import Path
 
 import joblib
-import pandas as pd
 import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.feather as feather
+import pyarrow.parquet as pq
 
+ROW_GROUP_SIZE = 2048
 
-def to_rows(property_dicts):
-    rows = []
+
+def to_table(property_dicts):
+    """Pivot {feature: {"cands": {building_id: value}}} into a long (building_id, feature_name, value) Arrow table"""
+    building_ids = []
+    feature_codes = []
+    feature_names = []
+    values = []
     for feature_name, feature_data in property_dicts.items():
         if not isinstance(feature_data, dict):
             continue
         cands = feature_data.get("cands", {})
-        if not isinstance(cands, dict):
+        if not isinstance(cands, dict) or not cands:
             continue
-        for building_id, value in cands.items():
-            if isinstance(value, (np.integer, np.floating)):
-                value = float(value)
-            elif isinstance(value, np.ndarray):
-                value = value.tolist()
-            rows.append(
-                {
-                    "building_id": str(building_id),
-                    "feature_name": str(feature_name),
-                    "value": value,
-                }
-            )
-    return rows
-
-
-def convert(input_path: Path, output_path: Path) -> None:
+        # Plain column lists instead of one Python dict per cell
+        feature_values = list(cands.values())
+        if all(isinstance(value, (int, float, np.integer, np.floating)) for value in feature_values):
+            values.extend(map(float, feature_values))
+        else:
+            values.extend(value.tolist() if isinstance(value, np.ndarray) else value for value in feature_values)
+        building_ids.extend(str(building_id) for building_id in cands)
+        feature_codes.append(np.full(len(cands), len(feature_names), dtype=np.int32))
+        feature_names.append(str(feature_name))
+    if not feature_names:
+        return pa.table(
+            {
+                "building_id": pa.array([], type=pa.string()),
+                "feature_name": pa.array([], type=pa.dictionary(pa.int32(), pa.string())),
+                "value": pa.array([], type=pa.float64()),
+            }
+        )
+    # feature_name has a handful of distinct values, so it is stored as int32 codes into a dictionary
+    feature_column = pa.DictionaryArray.from_arrays(
+        pa.array(np.concatenate(feature_codes)), pa.array(feature_names, type=pa.string())
+    )
+    return pa.table(
+        {
+            "building_id": pa.array(building_ids, type=pa.string()),
+            "feature_name": feature_column,
+            "value": pa.array(values, from_pandas=True),
+        }
+    )
+
+
+def convert(input_path: Path, output_path: Path, arrow_path: Path = None) -> None:
     data = joblib.load(input_path)
     if not isinstance(data, dict):
         raise ValueError("Expected dict in joblib file.")
 
-    rows = to_rows(data)
-    if not rows:
+    table = to_table(data)
+    if table.num_rows == 0:
         raise ValueError("No rows extracted from joblib data.")
 
-    df = pd.DataFrame(rows)
-    df.to_parquet(output_path, index=False)
+    # Sorted by building_id with small row groups, the min/max statistics let
+    # a filtered read of one building skip every row group but one
+    table = table.take(pc.sort_indices(table, sort_keys=[("building_id", "ascending")]))
+    pq.write_table(
+        table,
+        output_path,
+        row_group_size=ROW_GROUP_SIZE,
+        compression="zstd",
+        use_dictionary=["building_id", "feature_name"],
+        write_statistics=True,
+    )
+
+    # Uncompressed Arrow IPC copy for full-table loads: memory-mapped by the
+    # app and worker processes without decompression, sharing page cache
+    if arrow_path is not None:
+        feather.write_feather(table, arrow_path, compression="uncompressed")
 
 
 def main() -> None:
@@ -55,17 +93,23 @@ def main() -> None:
         required=True,
         help="Path to output Parquet file",
     )
+    parser.add_argument(
+        "--arrow-output",
+        help="Path to output Arrow IPC file (default: the Parquet path with an .arrow suffix)",
+    )
     args = parser.parse_args()
 
     input_path = Path(args.input)
     output_path = Path(args.output)
+    arrow_path = Path(args.arrow_output) if args.arrow_output else output_path.with_suffix(".arrow")
 
     if not input_path.exists():
         raise FileNotFoundError(f"Joblib file not found: {input_path}")
     output_path.parent.mkdir(parents=True, exist_ok=True)
 
-    convert(input_path, output_path)
+    convert(input_path, output_path, arrow_path)
     print(f"Saved Parquet: {output_path}")
+    print(f"Saved Arrow IPC: {arrow_path}")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+import argparse
+from pathlib import Path
+
+import orjson
+
+
+def convert(input_path: Path, output_path: Path) -> int:
+    """Rewrite {file: {building_id: data}} as one {"file", "bid", "data"} object per line"""
+    results = orjson.loads(input_path.read_bytes())
+    if not isinstance(results, dict):
+        raise ValueError("Expected dict in results JSON file.")
+
+    count = 0
+    with open(output_path, "wb") as out:
+        for file_name, file_buildings in results.items():
+            for building_id, building_data in file_buildings.items():
+                out.write(orjson.dumps({"file": file_name, "bid": building_id, "data": building_data}))
+                out.write(b"\n")
+                count += 1
+    return count
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Convert BKAFI detailed results JSON to JSON Lines.")
+    parser.add_argument(
+        "--input",
+        required=True,
+        help="Path to detailed results JSON file",
+    )
+    parser.add_argument(
+        "--output",
+        help="Path to output JSONL file (default: input path with .jsonl suffix)",
+    )
+    args = parser.parse_args()
+
+    input_path = Path(args.input)
+    output_path = Path(args.output) if args.output else input_path.with_suffix(".jsonl")
+
+    if not input_path.exists():
+        raise FileNotFoundError(f"Results file not found: {input_path}")
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+
+    count = convert(input_path, output_path)
+    print(f"Saved {count} buildings to JSONL: {output_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1095,6 +1095,9 @@ function calculateGeometricFeatures() {
             hideLoading();
         });
         
+        // Fetch features for every building in the viewer in one request
+        prefetchBuildingFeatures();
+        
         // If building properties window is open, show features
         if (selectedBuildingId) {
             loadBuildingFeatures(selectedBuildingId);
@@ -1214,6 +1217,42 @@ function loadBuildingFeatures(buildingId) {
         });
 }
 
+// Load features for all buildings in the viewer with a single batch request
+function prefetchBuildingFeatures() {
+    if (!selectedFile || !window.viewer || !window.viewer.buildingEntities) {
+        return;
+    }
+    
+    const ids = Array.from(window.viewer.buildingEntities.keys())
+        .filter(buildingId => !buildingFeaturesCache[buildingId]);
+    if (ids.length === 0) {
+        return;
+    }
+    
+    const fileAtRequest = selectedFile;
+    fetch('/api/building/features', {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({ file: selectedFile, ids })
+    })
+        .then(response => response.json())
+        .then(data => {
+            if (data.error || selectedFile !== fileAtRequest) {
+                return;
+            }
+            // Buildings without features are left out so a click still shows the server message
+            Object.entries(data).forEach(([buildingId, features]) => {
+                if (features && Object.keys(features).length > 0) {
+                    buildingFeaturesCache[buildingId] = features;
+                }
+            });
+            console.log(`Prefetched features for ${Object.keys(data).length} buildings`);
+        })
+        .catch(error => {
+            console.error('Error prefetching building features:', error);
+        });
+}
+
 // Show geometric features in properties window
 function showGeometricFeatures(features) {
     const propsListEl = document.getElementById('properties-list');
@@ -1,114 +1,133 @@
 import os
-import json
-import re
 from pathlib import Path
 
 import numpy as np
-import joblib
-import pandas as pd
+import orjson
+import msgpack
 from celery import Celery
+from celery.signals import worker_process_init
 import redis
 
+from data_cache import (
+    NUMERIC_ID_RE, BKAFI_FLAT_KEY, BKAFI_BY_FILE_KEY, BKAFI_HASH_KEY, BKAFI_PAIRS_KEY, bkafi_key,
+    building_features_key, build_features_from_parquet, count_pairs_per_file, ensure_features_files,
+    load_bkafi_results_file, write_bkafi_hash, write_bkafi_pairs
+)
+
 BASE_DIR = Path(__file__).parent
 DATA_DIR = BASE_DIR / 'data'
 RESULTS_DIR = BASE_DIR / 'results_demo'
 
 DEMO_RESULTS_JSON = RESULTS_DIR / 'demo_inference' / 'demo_detailed_results_XGBClassifier_seed1.json'
-JOBLIB_PATH = DATA_DIR / 'property_dicts' / 'Hague_demo_130425_demo_inference_vector_normalization=True_seed=1.joblib'
+DEMO_RESULTS_JSONL = DEMO_RESULTS_JSON.with_suffix('.jsonl')
 PARQUET_PATH = DATA_DIR / 'property_dicts' / 'features.parquet'
+JOBLIB_PATH = DATA_DIR / 'property_dicts' / 'Hague_demo_130425_demo_inference_vector_normalization=True_seed=1.joblib'
 
 REDIS_URL = os.getenv('REDIS_URL', 'redis://redis:6379/0')
 DEFAULT_CACHE_TTL = int(os.getenv('CACHE_TTL_SECONDS', '21600'))
+REDIS_MAX_CONNECTIONS = int(os.getenv('REDIS_MAX_CONNECTIONS', '32'))
+# Set by app.py when it queues the startup load (short TTL), extended here while the load runs
+# and cleared once it has finished
+BKAFI_WARMING_KEY = 'bkafi:warming'
+BKAFI_WARMING_TTL_SECONDS = int(os.getenv('BKAFI_WARMING_TTL_SECONDS', '300'))
+# Building ID / numeric ID -> [relative file path, source]
+BUILDING_FILE_INDEX_KEY = 'mp:building_file_index'
 
 celery = Celery('tasks', broker=REDIS_URL, backend=REDIS_URL)
 celery.conf.update(task_track_started=True)
 
 
+def _make_redis_client():
+    pool = redis.ConnectionPool.from_url(REDIS_URL, decode_responses=False, max_connections=REDIS_MAX_CONNECTIONS)
+    return redis.Redis(connection_pool=pool)
+
+
+# One pool per process, shared by every cache helper below
+_client = _make_redis_client()
+
+
 def _redis_client():
-    return redis.Redis.from_url(REDIS_URL, decode_responses=True)
+    return _client
+
+
+def reset_redis_pool():
+    """Start a fresh pool so a forked process never shares sockets with its parent"""
+    global _client
+    _client = _make_redis_client()
+
+
+@worker_process_init.connect
+def _reset_redis_pool_after_fork(**kwargs):
+    reset_redis_pool()
 
 
 def _json_default(value):
-    if isinstance(value, (np.integer, np.floating)):
+    # Only reached for what OPT_SERIALIZE_NUMPY leaves out, e.g. float16 scalars
+    if isinstance(value, np.generic):
         return value.item()
-    if isinstance(value, np.ndarray):
-        return value.tolist()
     return str(value)
 
 
-def _cache_set_json(key, payload, ttl=DEFAULT_CACHE_TTL):
-    client = _redis_client()
-    client.set(key, json.dumps(payload, default=_json_default), ex=ttl)
+def _dumps(payload):
+    # Same encoding app.py reads back with orjson (NaN becomes null instead of invalid JSON)
+    return orjson.dumps(payload, default=_json_default, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS)
 
 
-def _cache_get_json(key):
+def _cache_set_mp(key, payload, ttl=DEFAULT_CACHE_TTL):
     client = _redis_client()
-    raw = client.get(key)
-    if not raw:
-        return None
-    return json.loads(raw)
+    client.set(key, msgpack.packb(payload, use_bin_type=True), ex=ttl)
 
 
-def _build_features_from_parquet(parquet_path: Path):
-    df = pd.read_parquet(parquet_path)
-    building_features = {}
-    for row in df.itertuples(index=False):
-        building_id = str(row.building_id)
-        feature_name = str(row.feature_name)
-        value = row.value
-        building_features.setdefault(building_id, {})[feature_name] = value
-    return building_features
+def _cache_set_features(file_path, building_features, ttl=DEFAULT_CACHE_TTL):
+    client = _redis_client()
+    blob_key = f'features:{file_path}'
+    write_blob = not client.exists(blob_key)
+    with client.pipeline(transaction=False) as pipe:
+        if write_blob:
+            pipe.set(blob_key, _dumps(building_features), ex=ttl, nx=True)
+        for building_id, features in building_features.items():
+            pipe.set(building_features_key(building_id), _dumps(features), ex=ttl, nx=True)
+        pipe.execute()
+
+
+def index_building_files(source_dirs):
+    """
+    Map every CityObject ID (and its numeric part) to the file that contains it
+    source_dirs: list of (directory, source) pairs in search precedence order
+    """
+    index = {}
+    seen = set()
+    for directory, source in source_dirs:
+        directory = Path(directory) if directory else None
+        if not directory or not directory.exists():
+            continue
+        for file_path in directory.rglob('*.json'):
+            if file_path in seen:
+                continue
+            seen.add(file_path)
+            try:
+                with open(file_path, 'rb') as f:
+                    city_objects = orjson.loads(f.read()).get('CityObjects', {})
+            except Exception:
+                continue
+            entry = [str(file_path.relative_to(DATA_DIR)), source]
+            for obj_id in city_objects:
+                index.setdefault(obj_id, entry)
+                numeric_match = NUMERIC_ID_RE.search(obj_id)
+                if numeric_match:
+                    index.setdefault(numeric_match.group(1), entry)
+    return index
 
 
 @celery.task(name='tasks.calculate_features')
 def calculate_features(file_path):
-    if PARQUET_PATH.exists():
-        building_features = _build_features_from_parquet(PARQUET_PATH)
-        cache_key = f'features:{file_path}'
-        _cache_set_json(cache_key, building_features)
-        return {
-            'cache_key': cache_key,
-            'building_count': len(building_features)
-        }
-
-    if not JOBLIB_PATH.exists():
-        raise FileNotFoundError(f'Joblib file not found at {JOBLIB_PATH}')
-
-    with open(JOBLIB_PATH, 'rb') as f:
-        property_dicts = joblib.load(f)
-
-    building_ids = set()
-    if isinstance(property_dicts, dict) and len(property_dicts) > 0:
-        first_feature = list(property_dicts.values())[0]
-        if isinstance(first_feature, dict) and 'cands' in first_feature:
-            building_ids = set(str(bid) for bid in first_feature['cands'].keys())
-
-    building_features = {}
-    for building_id in building_ids:
-        building_id_str = str(building_id)
-        building_features[building_id_str] = {}
-        for feature_name, feature_data in property_dicts.items():
-            if isinstance(feature_data, dict) and 'cands' in feature_data:
-                cands_dict = feature_data['cands']
-                key_to_use = None
-                if building_id_str in cands_dict:
-                    key_to_use = building_id_str
-                else:
-                    for key in cands_dict.keys():
-                        if str(key) == building_id_str:
-                            key_to_use = key
-                            break
-                if key_to_use is not None:
-                    value = cands_dict[key_to_use]
-                    if isinstance(value, (np.integer, np.floating)):
-                        value = float(value)
-                    elif isinstance(value, np.ndarray):
-                        value = value.tolist()
-                    building_features[building_id_str][feature_name] = value
+    # The joblib property dicts are converted to parquet when the image is built, or here if it was skipped
+    if not ensure_features_files(PARQUET_PATH, JOBLIB_PATH):
+        raise FileNotFoundError(f'Features parquet not found at {PARQUET_PATH}')
 
+    building_features = build_features_from_parquet(PARQUET_PATH)
     cache_key = f'features:{file_path}'
-    _cache_set_json(cache_key, building_features)
-
+    _cache_set_features(file_path, building_features)
     return {
         'cache_key': cache_key,
         'building_count': len(building_features)
@@ -117,28 +136,47 @@ def calculate_features(file_path):
 
 @celery.task(name='tasks.load_bkafi_results')
 def load_bkafi_results():
-    if not DEMO_RESULTS_JSON.exists():
+    # A worker has the load now: keep the web workers answering 503 until it is done
+    _redis_client().set(BKAFI_WARMING_KEY, 1, ex=BKAFI_WARMING_TTL_SECONDS)
+    try:
+        return _load_bkafi_results()
+    finally:
+        # Lets the web workers stop answering 503 and fall back to their own load if this failed
+        _redis_client().delete(BKAFI_WARMING_KEY)
+
+
+def _load_bkafi_results():
+    results_path = DEMO_RESULTS_JSONL if DEMO_RESULTS_JSONL.exists() else DEMO_RESULTS_JSON
+    if not results_path.exists():
         raise FileNotFoundError(f'BKAFI results file not found at {DEMO_RESULTS_JSON}')
 
-    with open(DEMO_RESULTS_JSON, 'r', encoding='utf-8') as f:
-        results_dict = json.load(f)
-
-    flattened_cache = {}
-    total_pairs = 0
-    unique_candidates = 0
+    # Taken before reading, so a rewrite during the load is stored under the old version and reloaded later
+    source_mtime = results_path.stat().st_mtime_ns
+    flattened_cache, results_dict = load_bkafi_results_file(results_path)
+    unique_candidates = sum(len(file_buildings) for file_buildings in results_dict.values())
+    pairs_per_file = count_pairs_per_file(results_dict)
+    total_pairs = sum(pairs_per_file.values())
 
-    for file_name, file_buildings in results_dict.items():
-        for building_id, building_data in file_buildings.items():
-            flattened_cache[building_id] = building_data
-            unique_candidates += 1
-            total_pairs += len(building_data.get('possible_matches', []))
-
-    _cache_set_json('bkafi:flat', flattened_cache)
-    _cache_set_json('bkafi:by_file', results_dict)
+    _cache_set_mp(bkafi_key(BKAFI_FLAT_KEY, source_mtime), flattened_cache)
+    _cache_set_mp(bkafi_key(BKAFI_BY_FILE_KEY, source_mtime), results_dict)
+    write_bkafi_hash(_redis_client(), flattened_cache, source_mtime, DEFAULT_CACHE_TTL)
+    write_bkafi_pairs(_redis_client(), pairs_per_file, source_mtime, DEFAULT_CACHE_TTL)
 
     return {
-        'cache_key_flat': 'bkafi:flat',
-        'cache_key_by_file': 'bkafi:by_file',
+        'cache_key_flat': bkafi_key(BKAFI_FLAT_KEY, source_mtime),
+        'cache_key_by_file': bkafi_key(BKAFI_BY_FILE_KEY, source_mtime),
+        'cache_key_by_id': bkafi_key(BKAFI_HASH_KEY, source_mtime),
+        'cache_key_pairs': bkafi_key(BKAFI_PAIRS_KEY, source_mtime),
         'total_pairs': int(total_pairs),
         'unique_candidates': int(unique_candidates)
     }
+
+
+@celery.task(name='tasks.build_building_file_index')
+def build_building_file_index(source_dirs):
+    index = index_building_files(source_dirs)
+    _cache_set_mp(BUILDING_FILE_INDEX_KEY, index)
+    return {
+        'cache_key': BUILDING_FILE_INDEX_KEY,
+        'building_count': len(index)
+    }